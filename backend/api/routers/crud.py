@@ -7,6 +7,7 @@ from bson import ObjectId
 import logging
 
 from backend.app.db import db
+from backend.app.responses import ORJSONResponse
 from backend.app.schemas import (
     User, Project, UserStory, DependencyGraph, ProjectConfig
 )
@@ -608,10 +609,18 @@ for _name, _coll, _schema in [
 
 __all__ = ["router"]
 
+# Campos que leen los listados de historias; el resto del documento no sale de Mongo
+_US_LIST_PROJECTION = {f: 1 for f in (
+    "projectId", "project_id", "code", "epica", "nombre", "descripcion", "criterios",
+    "createdAt", "created_at", "priority", "storyPoints", "story_points",
+    "dor", "status", "deps", "ai",
+)}
+
 # Endpoint personalizado que REEMPLAZA al GET /user_stories/ del CRUDRouter
 # (Se registra DESPUÉS para tener prioridad sobre el automático)
 @router.get(
     "/user_stories/", 
+    response_class=ORJSONResponse,
     tags=["User Stories"],
     summary="Listar historias de usuario (Filtrado)",
     description="Obtiene historias de usuario con soporte para filtros por proyecto, épica, estado y búsqueda de texto. Soporta paginación."
@@ -685,9 +694,9 @@ async def get_user_stories(
         if page is not None and size is not None:
             total = await db.user_stories.count_documents(filtro)
             skip = (page - 1) * size
-            historias = await db.user_stories.find(filtro).skip(skip).limit(size).to_list(None)
+            historias = await db.user_stories.find(filtro, _US_LIST_PROJECTION).skip(skip).limit(size).to_list(None)
         else:
-            historias = await db.user_stories.find(filtro).to_list(None)
+            historias = await db.user_stories.find(filtro, _US_LIST_PROJECTION).to_list(None)
             total = len(historias)
             
         logging.info(f"Encontradas {len(historias)} historias (Total: {total}) con filtro: {filtro}")
@@ -714,15 +723,15 @@ async def get_user_stories(
         logging.info(f"Retornando {len(result)} historias")
         
         if page is not None and size is not None:
-            return {
+            return ORJSONResponse({
                 "items": result,
                 "total": total,
                 "page": page,
                 "size": size,
                 "pages": (total + size - 1) // size
-            }
+            })
         
-        return result
+        return ORJSONResponse(result)
         
     except HTTPException:
         # Re-lanzar HTTPExceptions sin modificar
@@ -732,7 +741,7 @@ async def get_user_stories(
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
 # Endpoint adicional para Product Backlog
-@router.get("/user_stories/product_backlog", tags=["User Stories"])
+@router.get("/user_stories/product_backlog", response_class=ORJSONResponse, tags=["User Stories"])
 async def get_user_stories_product_backlog(product_id: str = None):
     # Buscar por ambos formatos de project_id
     filtro = {}
@@ -741,7 +750,7 @@ async def get_user_stories_product_backlog(product_id: str = None):
             {"project_id": product_id},
             {"projectId": product_id}
         ]}
-    historias = await db.user_stories.find(filtro).to_list(None)
+    historias = await db.user_stories.find(filtro, _US_LIST_PROJECTION).to_list(None)
     result = []
     for h in historias:
         result.append({
@@ -757,10 +766,10 @@ async def get_user_stories_product_backlog(product_id: str = None):
             "_id": str(h.get("_id", "")),
             "project_id": h.get("project_id", h.get("projectId", "")),
         })
-    return result
+    return ORJSONResponse(result)
 
 # Nuevo endpoint para filtrar US por proyecto
-@router.get("/user_stories/by-project/{projectId}", tags=["User Stories"])
+@router.get("/user_stories/by-project/{projectId}", response_class=ORJSONResponse, tags=["User Stories"])
 async def get_user_stories_by_project(
     projectId: str, 
     page: int | None = None, 
@@ -822,9 +831,9 @@ async def get_user_stories_by_project(
         if page is not None and size is not None:
             total = await db.user_stories.count_documents(filtro)
             skip = (page - 1) * size
-            historias = await db.user_stories.find(filtro).skip(skip).limit(size).to_list(None)
+            historias = await db.user_stories.find(filtro, _US_LIST_PROJECTION).skip(skip).limit(size).to_list(None)
         else:
-            historias = await db.user_stories.find(filtro).to_list(None)
+            historias = await db.user_stories.find(filtro, _US_LIST_PROJECTION).to_list(None)
             total = len(historias)
             
         logging.info(f"Encontradas {len(historias)} historias (Total: {total}) con filtro: {filtro}")
@@ -851,15 +860,15 @@ async def get_user_stories_by_project(
         logging.info(f"Retornando {len(result)} historias")
         
         if page is not None and size is not None:
-            return {
+            return ORJSONResponse({
                 "items": result,
                 "total": total,
                 "page": page,
                 "size": size,
                 "pages": (total + size - 1) // size
-            }
+            })
             
-        return result
+        return ORJSONResponse(result)
         
     except HTTPException:
         raise
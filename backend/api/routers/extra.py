@@ -1,10 +1,13 @@
 from __future__ import annotations
-from fastapi import APIRouter, HTTPException, Body, status, Depends
+from fastapi import APIRouter, HTTPException, Body, Response, status, Depends
 from bson import ObjectId
 from typing import List
 
 from ...app.db import db
-from ...app.schemas import User, Project, UserStory, DependencyGraph
+from ...app.schemas import (
+    User, Project, UserStory, DependencyGraph, ROLES,
+    USER_LIST, PROJECT_LIST, USER_STORY_LIST,
+)
 from ..services.dependency_service import DependencyService
 from ..services.release_backlog_service import ReleaseBacklogService
 from ..services.release_planning_service import ReleasePlanningService
@@ -23,37 +26,43 @@ async def get_user_by_email(email: str):
     doc = await db.users.find_one({"email": email})
     if not doc:
         raise HTTPException(404, "User not found")
-    return doc
+    return User.from_mongo(doc)
 
 @router.get(
     "/users/by-role/{role}", 
-    response_model=list[User], 
+    response_model=None,
+    responses={200: {"model": list[User]}},
     tags=["Users"],
     summary="Listar usuarios por rol"
 )
 async def list_users_by_role(role: str):
-    if role not in {"student", "advisor", "po", "admin"}:
+    if role not in ROLES:
         raise HTTPException(400, "Invalid role")
-    return await db.users.find({"role": role}).to_list(None)
+    users = [User.from_mongo(d) for d in await db.users.find({"role": role}).to_list(None)]
+    return Response(USER_LIST.dump_json(users, by_alias=True), media_type="application/json")
 
 # ───────────────────────────── PROJECTS ───────────────────────────────
-@router.get("/projects/by-owner/{owner_id}", response_model=list[Project])
+@router.get("/projects/by-owner/{owner_id}", response_model=None, responses={200: {"model": list[Project]}})
 async def projects_by_owner(owner_id: str):
     oid = ObjectId(owner_id)
-    return await db.projects.find({"owner_id": oid}).to_list(None)
+    projects = [Project.from_mongo(d) for d in await db.projects.find({"owner_id": oid}).to_list(None)]
+    return Response(PROJECT_LIST.dump_json(projects, by_alias=True), media_type="application/json")
 
-@router.get("/projects/search", response_model=list[Project])
+@router.get("/projects/search", response_model=None, responses={200: {"model": list[Project]}})
 async def search_projects(q: str):
     regex = {"$regex": q, "$options": "i"}
-    return await db.projects.find({"$or": [{"code": regex}, {"name": regex}]}).to_list(None)
+    docs = await db.projects.find({"$or": [{"code": regex}, {"name": regex}]}).to_list(None)
+    projects = [Project.from_mongo(d) for d in docs]
+    return Response(PROJECT_LIST.dump_json(projects, by_alias=True), media_type="application/json")
 
 # ─────────────────────────── USER STORIES ─────────────────────────────
-@router.get("/projects/{project_id}/stories", response_model=list[UserStory])
+@router.get("/projects/{project_id}/stories", response_model=None, responses={200: {"model": list[UserStory]}})
 async def stories_of_project(project_id: str):
     try:
         oid = ObjectId(project_id)
         stories = await db.user_stories.find({"project_id": oid}).to_list(None)
-        return stories
+        stories = [UserStory.from_mongo(d) for d in stories]
+        return Response(USER_STORY_LIST.dump_json(stories, by_alias=True), media_type="application/json")
     except Exception as e:
         import logging
         logging.error(f"Error getting stories for project {project_id}: {str(e)}")
@@ -107,7 +116,7 @@ async def get_dependency_graph(project_id: str):
     doc = await db.dependencies_graph.find_one({"project_id": pid})
     if not doc:
         raise HTTPException(404, "Graph not found")
-    return doc
+    return DependencyGraph.from_trusted_mongo(doc)
 
 @router.post(
     "/projects/{project_id}/dependency-graph/generate",
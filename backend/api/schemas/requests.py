@@ -1,8 +1,10 @@
 from __future__ import annotations
 from datetime import date, datetime
-from typing import Literal, List
+from typing import List
 from pydantic import BaseModel, HttpUrl, Field, EmailStr
 
+from ...app.schemas import Role
+
 # ---------- User ----------
 class UserCreateIn(BaseModel):
     email: EmailStr = Field(..., description="Correo electrónico del nuevo usuario", example="nuevo.usuario@example.com")
@@ -14,7 +16,7 @@ class UserCreateIn(BaseModel):
         description="Contraseña (mínimo 6 caracteres, máximo 72 debido al límite de bcrypt)",
         example="Password123!"
     )
-    role: Literal["student", "advisor", "po", "admin"] = Field(..., description="Rol del usuario en el sistema", example="student")
+    role: Role = Field(..., description="Rol del usuario en el sistema", example="student")
 
 # ---------- Chat ----------
 class ChatIn(BaseModel):
@@ -1,7 +1,9 @@
 # backend/api/schemas/responses.py
 from datetime import date, datetime
-from typing import List, Literal
-from pydantic import BaseModel, EmailStr, Field
+from typing import List
+from pydantic import BaseModel, Field
+
+from ...app.schemas import Role
 
 class PdfStoryOut(BaseModel):
     epic: str
@@ -25,9 +27,10 @@ class PdfImportOut(BaseModel):
 class UserOut(BaseModel):
     """Respuesta de usuario sin datos sensibles como la contraseña."""
     id: str = Field(..., description="ID único del usuario", example="65e123abc...")
-    email: EmailStr = Field(..., description="Correo electrónico", example="usuario@example.com")
+    # str y no EmailStr: el correo ya se validó al registrarse, no se re-parsea al responder
+    email: str = Field(..., description="Correo electrónico", example="usuario@example.com", json_schema_extra={"format": "email"})
     name: str = Field(..., description="Nombre completo", example="Juan Pérez")
-    role: Literal["student", "advisor", "po", "admin"] = Field(..., description="Rol del usuario")
+    role: Role = Field(..., description="Rol del usuario")
     created_at: datetime = Field(..., description="Fecha de creación del registro")
 
 class ReleaseBacklogOut(BaseModel):
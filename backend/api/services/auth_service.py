@@ -1,10 +1,11 @@
+import logging
 from passlib.context import CryptContext
-from datetime import datetime
+from datetime import datetime, timezone
 from fastapi import HTTPException
 from bson import ObjectId
 
 from ...app.db import db
-from ...app.schemas import User
+from ...app.schemas import User, UserCredentials
 from ..schemas.requests import UserCreateIn
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -16,7 +17,6 @@ class AuthService:
         try:
             return pwd_context.hash(password)
         except Exception as e:
-            import logging
             logging.error(f"Error hashing password: {type(e).__name__}: {str(e)} | Password length: {len(password)} | Password bytes: {len(password.encode('utf-8'))}")
             raise
     
@@ -33,27 +33,59 @@ class AuthService:
                 detail="El email ya está registrado"
             )
         
+        password_hash = self.hash_password(user_data.password)
         user_doc = {
             "email": user_data.email,
             "name": user_data.name,
-            "password_hash": self.hash_password(user_data.password),
             "role": user_data.role,
-            "created_at": datetime.utcnow()
+            "created_at": datetime.now(timezone.utc)
         }
         
         result = await db.users.insert_one(user_doc)
+        try:
+            await self._save_credentials(result.inserted_id, password_hash)
+        except Exception:
+            # Sin credenciales el usuario no podría entrar y su email quedaría ocupado
+            await db.users.delete_one({"_id": result.inserted_id})
+            raise
         
         created_user = await db.users.find_one({"_id": result.inserted_id})
         return User(**created_user)
     
+    @staticmethod
+    async def _save_credentials(user_id: ObjectId, password_hash: str) -> None:
+        creds = UserCredentials(user_id=user_id, password_hash=password_hash)
+        await db.user_credentials.replace_one(
+            {"user_id": user_id},
+            creds.model_dump(exclude={"id"}),
+            upsert=True
+        )
+    
+    async def _migrate_legacy_hash(self, user_id: ObjectId, password_hash: str, save: bool) -> None:
+        """Mueve el hash embebido a user_credentials. El hash solo se borra de `users`
+        cuando la credencial ya está guardada; si algo falla se reintenta en el próximo login."""
+        try:
+            if save:
+                await self._save_credentials(user_id, password_hash)
+            await db.users.update_one({"_id": user_id}, {"$unset": {"password_hash": ""}})
+        except Exception as e:
+            logging.warning(f"No se pudo migrar la credencial del usuario {user_id}: {e}")
+    
     async def authenticate_user(self, email: str, password: str) -> User | None:
         user_doc = await db.users.find_one({"email": email})
         
         if not user_doc:
             return None
+        
+        creds = await db.user_credentials.find_one({"user_id": user_doc["_id"]}, {"password_hash": 1})
+        # Usuarios anteriores a user_credentials guardan el hash en el propio documento
+        password_hash = creds["password_hash"] if creds else user_doc.get("password_hash")
             
-        if not self.verify_password(password, user_doc["password_hash"]):
+        if not password_hash or not self.verify_password(password, password_hash):
             return None
+        
+        if "password_hash" in user_doc:
+            await self._migrate_legacy_hash(user_doc["_id"], password_hash, creds is None)
             
         return User(**user_doc)
 
@@ -10,6 +10,7 @@ from __future__ import annotations
 
 import os, json, logging, anyio
 import time 
+from dataclasses import asdict
 from typing import List, Set, Tuple
 
 import google.generativeai as genai
@@ -17,6 +18,7 @@ from fastapi import HTTPException
 from bson import ObjectId
 
 from ...app.db import db
+from .gemini import get_model
 from ...app.schemas import DependencyPair, DependencyGraph
 
 # ────────────────────────── Configuración Gemini ──────────────────────────
@@ -51,7 +53,7 @@ class DependencyService:
     """Construye (o reconstruye) el grafo de dependencias para un proyecto."""
 
     def __init__(self):
-        self.model = genai.GenerativeModel(MODEL_NAME)
+        self.model = get_model(MODEL_NAME)
 
     async def build_graph(self, project_id: str) -> DependencyGraph:
         try:
@@ -75,7 +77,7 @@ class DependencyService:
 
         graph_doc = {
             "project_id": pid,
-            "pairs": [p.model_dump() for p in pairs],
+            "pairs": [asdict(p) for p in pairs],
             "total_prompt_tokens": prompt_tokens,
             "total_completion_tokens": completion_tokens,
             "total_processing_time_ms": processing_time_ms,
@@ -89,7 +91,8 @@ class DependencyService:
         )
         
         logging.info(f"Grafo generado exitosamente para proyecto {project_id}")
-        return DependencyGraph(**graph_doc)
+        # Los pares ya son DependencyPair válidos: no hace falta revalidarlos
+        return DependencyGraph.model_construct(**{**graph_doc, "pairs": pairs})
 
     async def _ask_gemini(self, prompt: str) -> Tuple[List[DependencyPair], int, int, float]:
         prompt_tokens = 0
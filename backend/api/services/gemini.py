@@ -0,0 +1,17 @@
+# backend/api/services/gemini.py
+"""
+Instancias compartidas de `GenerativeModel`. Los servicios se crean en cada
+petición (Depends()), así que en vez de construir un modelo por llamada se
+reutiliza uno por nombre durante toda la vida del proceso.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+
+import google.generativeai as genai
+
+
+@lru_cache(maxsize=None)
+def get_model(name: str) -> genai.GenerativeModel:
+    """Devuelve el modelo `name`, creándolo solo la primera vez."""
+    return genai.GenerativeModel(name)
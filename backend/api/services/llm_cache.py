@@ -0,0 +1,89 @@
+# backend/api/services/llm_cache.py
+"""
+Caché exacta de respuestas LLM: un LRU en memoria del proceso respaldado
+por la colección `llm_cache`. Las entradas caducan a los LLM_CACHE_TTL_SECONDS
+(backend/app/db.py): en Mongo las borra el índice TTL sobre `created_at` y en memoria
+se descartan al leerlas.
+"""
+from __future__ import annotations
+
+import json, hashlib, logging, time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from ...app.db import db, LLM_CACHE_TTL_SECONDS
+
+MEMORY_ITEMS = 512
+
+
+class LLMCache:
+    def __init__(self, max_items: int = MEMORY_ITEMS, ttl_seconds: int = LLM_CACHE_TTL_SECONDS):
+        # clave -> (texto, instante de expiración en segundos epoch)
+        self._memory: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+        self._max_items = max_items
+        self._ttl = ttl_seconds
+
+    @staticmethod
+    def key(model: str, prompt: str, **params) -> str:
+        """Hash estable del modelo, el prompt y los parámetros de generación."""
+        payload = json.dumps({"model": model, "prompt": prompt, **params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _expires_at(self, created_at: datetime | None) -> float:
+        if created_at is None:
+            return time.time() + self._ttl
+        if created_at.tzinfo is None:
+            # Motor devuelve fechas UTC sin zona
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return created_at.timestamp() + self._ttl
+
+    def _remember(self, key: str, text: str, expires_at: float) -> None:
+        self._memory[key] = (text, expires_at)
+        self._memory.move_to_end(key)
+        if len(self._memory) > self._max_items:
+            self._memory.popitem(last=False)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """Devuelve las respuestas cacheadas; lo que no está en memoria se busca con un solo $in."""
+        found = {}
+        missing = []
+        now = time.time()
+        for k in keys:
+            entry = self._memory.get(k)
+            if entry and entry[1] > now:
+                self._memory.move_to_end(k)
+                found[k] = entry[0]
+            else:
+                if entry:
+                    del self._memory[k]
+                missing.append(k)
+
+        if missing:
+            try:
+                async for doc in db.llm_cache.find({"_id": {"$in": missing}}, {"text": 1, "created_at": 1}):
+                    # El monitor TTL de Mongo pasa cada ~60 s: puede quedar algún documento caducado
+                    expires_at = self._expires_at(doc.get("created_at"))
+                    if expires_at <= now:
+                        continue
+                    found[doc["_id"]] = doc["text"]
+                    self._remember(doc["_id"], doc["text"], expires_at)
+            except Exception as e:
+                # La caché nunca debe romper la petición
+                logging.warning(f"No se pudo leer llm_cache: {e}")
+        return found
+
+    async def set(self, key: str, text: str) -> None:
+        created_at = datetime.now(timezone.utc)
+        self._remember(key, text, self._expires_at(created_at))
+        try:
+            await db.llm_cache.replace_one(
+                {"_id": key},
+                {"_id": key, "text": text, "created_at": created_at},
+                upsert=True
+            )
+        except Exception as e:
+            logging.warning(f"No se pudo escribir en llm_cache: {e}")
+
+
+llm_cache = LLMCache()
@@ -1,6 +1,6 @@
 from __future__ import annotations
-import base64, io, json, logging, os, anyio
-from datetime import datetime
+import asyncio, base64, io, json, logging, os, re, anyio
+from datetime import datetime, timezone
 import time # Importar el módulo time
 from typing import List
 
@@ -14,10 +14,14 @@ from pymongo.errors import BulkWriteError
 
 from ..schemas.responses import PdfStoryOut, PdfImportOut
 from ...app.db import db
+from .gemini import get_model
 
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 MODEL = os.getenv("GEMINI_MODEL", "gemini-3.1-pro-preview")
 CHARS = 15_000
+MAX_CONCURRENCY = int(os.getenv("PDF_MAX_CONCURRENCY", "4"))  # chunks enviados a Gemini a la vez
+# Líneas que son un objeto JSON completo, ignorando espacios alrededor
+_JSON_LINE_RE = re.compile(r"^[^\S\n]*(\{.*\})[^\S\n]*$", re.MULTILINE)
 
 PROMPT = """
 Eres un experto analista de requisitos y creador de Historias de Usuario (HU).
@@ -112,10 +116,17 @@ class PdfService:
         total_completion_tokens = 0
         total_processing_time_ms = 0.0
 
-        for chunk in self._chunks(plain):
+        semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+        async def _chat_limited(chunk: str):
+            async with semaphore:
+                return await self._chat(chunk)
+
+        # Los chunks se procesan en paralelo; gather conserva el orden original
+        results = await asyncio.gather(*(_chat_limited(c) for c in self._chunks(plain)))
+        for raw, prompt_t, completion_t, proc_t in results:
             # Si _chat devuelve una cadena vacía, _parse_objs devolverá []
             # y el bucle continuará con el siguiente chunk sin fallar.
-            raw, prompt_t, completion_t, proc_t = await self._chat(chunk)
             historias.extend(self._parse_objs(raw))
             total_prompt_tokens += prompt_t
             total_completion_tokens += completion_t
@@ -130,6 +141,7 @@ class PdfService:
         }
         docs, seen = [], set(existing_codes)
         skipped_count = 0
+        created_at = datetime.now(timezone.utc)  # una sola marca para todo el lote
         for h in historias:
             if h.us in seen:
                 logging.warning(f"Saltando historia duplicada: {h.us} (ya existe en proyecto {project_id})")
@@ -144,7 +156,7 @@ class PdfService:
                     "descripcion": h.descripcion,
                     "criterios":   h.criterios,
                     "code":        h.us,
-                    "created_at":  datetime.utcnow(),
+                    "created_at":  created_at,
                     # Campos adicionales para Product Backlog generados por IA
                     "priority": h.priority,
                     "story_points": h.story_points,
@@ -204,7 +216,7 @@ class PdfService:
         retorna una cadena vacía en lugar de lanzar una excepción.
         Retorna el contenido, prompt_tokens, completion_tokens y tiempo de procesamiento.
         """
-        model = genai.GenerativeModel(MODEL)
+        model = get_model(MODEL)
         prompt_tokens = 0
         completion_tokens = 0
         processing_time_ms = 0.0
@@ -260,18 +272,16 @@ class PdfService:
         if not raw: # Si la entrada es vacía, no hay nada que hacer.
             return historias
 
-        for line in raw.splitlines():
-            line = line.strip()
-            # Una comprobación más flexible para JSON que pudiera estar indentado
-            if line.startswith("{") and line.endswith("}"):
-                try:
-                    data = json.loads(line)
-                    # Aseguramos que la clave "criterios" siempre exista
-                    if "criterios" not in data:
-                        data["criterios"] = []
-                    historias.append(PdfStoryOut(**data))
-                except (json.JSONDecodeError, TypeError, KeyError) as err:
-                    logging.warning(f"Línea JSON descartada por error de parseo: {err} | Línea: '{line}'")
+        # Una sola pasada del regex: solo llegan aquí líneas que empiezan con { y terminan con }
+        for line in _JSON_LINE_RE.findall(raw):
+            try:
+                data = json.loads(line)
+                # Aseguramos que la clave "criterios" siempre exista
+                if "criterios" not in data:
+                    data["criterios"] = []
+                historias.append(PdfStoryOut(**data))
+            except (json.JSONDecodeError, TypeError, KeyError) as err:
+                logging.warning(f"Línea JSON descartada por error de parseo: {err} | Línea: '{line}'")
         return historias
 
     # ───────── creación de proyecto ─────────
@@ -1,20 +1,127 @@
 from __future__ import annotations
 import os
 import json
+import orjson
 import logging
+import asyncio
+import re
 from typing import List, Optional
 from bson import ObjectId
 import google.generativeai as genai
 from ...app.db import db
+from .gemini import get_model
 from ...app.schemas import UserStory
+from .llm_cache import llm_cache
 
 # Configuración de Gemini
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash") # Usando flash para mayor velocidad en refinamiento
+# Llamadas simultáneas a Gemini por petición de refinamiento
+MAX_CONCURRENCY = int(os.getenv("REFINEMENT_MAX_CONCURRENCY", "5"))
+# Todas las respuestas son un único objeto JSON acotado: se fuerza el tipo MIME
+# y se limita la salida para cortar generaciones desbocadas
+GENERATION_CONFIG = {
+    "max_output_tokens": 2048,
+    "response_mime_type": "application/json",
+}
+
+# Contenido de un bloque ```json ... ``` (o ``` ... ```) en la respuesta del modelo
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL)
+
+def _strip_fences(text: str) -> str:
+    """Devuelve el JSON de la respuesta, sin las vallas de markdown si las hay."""
+    m = _FENCE_RE.search(text)
+    return (m[1] if m else text).strip()
+
+# ───────────────────────────── PROMPTS para Gemini ────────────────────────
+# Las instrucciones son idénticas en cada llamada y van primero; los datos de la
+# historia se añaden al final para maximizar el prefijo común entre peticiones.
+FIX_QUALITY_PROMPT = """
+Eres un experto en Product Backlog y calidad de requisitos (INVEST).
+Tu tarea es mejorar la calidad de la Historia de Usuario que aparece al final.
+
+MEJORAS REQUERIDAS:
+1. Asegúrate de que la descripción siga el formato: "Como [rol], quiero [funcionalidad], para [beneficio]".
+2. Mejora la claridad y especificidad de los criterios de aceptación.
+3. Corrige ortografía y gramática.
+4. Ajusta el DoR (Definition of Ready) score basado en la nueva calidad (0-100).
+
+RESPUESTA:
+Devuelve un JSON estrictamente con esta estructura:
+{
+    "nombre": "título mejorado",
+    "descripcion": "descripción mejorada",
+    "criterios": ["criterio 1", "criterio 2", ...],
+    "dor": 95,
+    "status": "Ready"
+}
+
+Historia de Usuario:
+"""
+
+GHERKIN_PROMPT = """
+Eres un experto en BDD (Behavior Driven Development) y Gherkin.
+Tu tarea es transformar los Criterios de Aceptación tradicionales de la Historia de Usuario que aparece al final en escenarios Gherkin profesionales.
+
+REGLAS:
+1. Crea UN escenario Gherkin por cada criterio de aceptación original.
+2. Usa palabras clave: Escenario, Dado, Cuando, Entonces, Y.
+3. Mantén el idioma en ESPAÑOL.
+4. Cada escenario debe ser una cadena independiente en la lista de respuesta.
+5. Agrega saltos de línea (\n) dentro de cada cadena para separar Dado, Cuando y Entonces.
+
+RESPUESTA:
+Devuelve un JSON estrictamente con esta estructura:
+{
+    "criterios_gherkin": [
+        "Escenario: Búsqueda exitosa\\nDado que estoy en el home\\nCuando busco \"celular\"\\nEntonces veo resultados",
+        "Escenario: Búsqueda sin resultados\\nDado que estoy en el home\\nCuando busco \"xyz123\"\\nEntonces veo mensaje de error"
+    ]
+}
+
+Historia de Usuario:
+"""
+
+ESTIMATE_PROMPT = """
+Eres un experto en estimación de software usando Puntos de Historia (escala Fibonacci: 1, 2, 3, 5, 8, 13, 21).
+Analiza la complejidad de la Historia de Usuario que aparece al final.
+
+Considera:
+1. Complejidad técnica.
+2. Esfuerzo de implementación.
+3. Ambigüedad/Incertidumbre.
+
+RESPUESTA:
+Devuelve un JSON con esta estructura:
+{
+    "story_points": 5,
+    "justificacion": "Breve explicación de por qué este puntaje"
+}
+
+Historia de Usuario:
+"""
+
+DUPLICATES_PROMPT = """
+Analiza las Historias de Usuario que aparecen al final e identifica posibles duplicados o redundancias semánticas.
+
+RESPUESTA:
+Devuelve un JSON con una lista de grupos de duplicados:
+{
+    "duplicados": [
+        {
+            "ids": ["id1", "id2"],
+            "razon": "Explicación de por qué son duplicados"
+        }
+    ]
+}
+Si no hay duplicados, devuelve una lista vacía.
+
+Historias:
+"""
 
 class RefinementService:
     def __init__(self):
-        self.model = genai.GenerativeModel(MODEL_NAME)
+        self.model = get_model(MODEL_NAME)
 
     def _serialize_mongo_doc(self, data):
         """Recursivamente convierte ObjectId a string."""
@@ -26,51 +133,56 @@ class RefinementService:
             return str(data)
         return data
 
-    async def get_stories_by_ids(self, story_ids: List[str]) -> List[dict]:
+    async def _generate_many(self, prompts: List[str]) -> list:
+        """Devuelve el texto de Gemini para cada prompt, reutilizando llm_cache cuando es posible.
+        Las llamadas pendientes van en paralelo, limitadas por un semáforo; los errores
+        se devuelven en la posición de su prompt en lugar de propagarse."""
+        keys = [llm_cache.key(MODEL_NAME, p, **GENERATION_CONFIG) for p in prompts]
+        cached = await llm_cache.get_many(keys)
+        semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+        async def _generate(prompt: str, key: str) -> str:
+            if key in cached:
+                return cached[key]
+            async with semaphore:
+                response = await self.model.generate_content_async(prompt, generation_config=GENERATION_CONFIG)
+            text = response.text
+            if text:
+                await llm_cache.set(key, text)
+            return text
+
+        return await asyncio.gather(*(_generate(p, k) for p, k in zip(prompts, keys)), return_exceptions=True)
+
+    async def get_stories_by_ids(self, story_ids: List[str], projection: Optional[dict] = None) -> List[dict]:
+        """Una sola consulta $in; conserva el orden de story_ids y omite los que no existen.
+        `projection` limita los campos leídos cuando no se necesita el documento completo."""
         oids = [ObjectId(sid) for sid in story_ids]
-        return await db.user_stories.find({"_id": {"$in": oids}}).to_list(None)
+        docs = await db.user_stories.find({"_id": {"$in": oids}}, projection).to_list(None)
+        by_id = {d["_id"]: d for d in docs}
+        return [by_id[oid] for oid in dict.fromkeys(oids) if oid in by_id]
 
     async def fix_quality(self, story_ids: List[str]) -> List[dict]:
         stories = await self.get_stories_by_ids(story_ids)
         if not stories:
             return []
 
+        prompts = [
+            FIX_QUALITY_PROMPT
+            + f"Título: {story.get('nombre', '')}\n"
+            + f"Descripción: {story.get('descripcion', '')}\n"
+            + f"Criterios de Aceptación: {json.dumps(story.get('criterios', []))}"
+            for story in stories
+        ]
+
+        responses = await self._generate_many(prompts)
         refined_stories = []
-        for story in stories:
-            prompt = f"""
-            Eres un experto en Product Backlog y calidad de requisitos (INVEST).
-            Tu tarea es mejorar la calidad de la siguiente Historia de Usuario:
-
-            Título: {story.get('nombre', '')}
-            Descripción: {story.get('descripcion', '')}
-            Criterios de Aceptación: {json.dumps(story.get('criterios', []))}
-
-            MEJORAS REQUERIDAS:
-            1. Asegúrate de que la descripción siga el formato: "Como [rol], quiero [funcionalidad], para [beneficio]".
-            2. Mejora la claridad y especificidad de los criterios de aceptación.
-            3. Corrige ortografía y gramática.
-            4. Ajusta el DoR (Definition of Ready) score basado en la nueva calidad (0-100).
-
-            RESPUESTA:
-            Devuelve un JSON estrictamente con esta estructura:
-            {{
-                "nombre": "título mejorado",
-                "descripcion": "descripción mejorada",
-                "criterios": ["criterio 1", "criterio 2", ...],
-                "dor": 95,
-                "status": "Ready"
-            }}
-            """
-            response = await self.model.generate_content_async(prompt)
+        for story, response in zip(stories, responses):
+            if isinstance(response, Exception):
+                logging.error(f"Error calling Gemini for fix_quality: {response}")
+                continue
             try:
                 # Extraer JSON de la respuesta
-                text = response.text
-                if "```json" in text:
-                    text = text.split("```json")[1].split("```")[0]
-                elif "```" in text:
-                    text = text.split("```")[1].split("```")[0]
-                
-                refined_data = json.loads(text.strip())
+                refined_data = orjson.loads(_strip_fences(response))
                 refined_stories.append({
                     "id": str(story['_id']),
                     "original": self._serialize_mongo_doc(story),
@@ -87,37 +199,21 @@ class RefinementService:
         if not stories:
             return []
 
+        prompts = [
+            GHERKIN_PROMPT
+            + f"Título: {story.get('nombre', '')}\n"
+            + f"Criterios Originales: {json.dumps(story.get('criterios', []))}"
+            for story in stories
+        ]
+
+        responses = await self._generate_many(prompts)
         refined_stories = []
-        for story in stories:
-            prompt = f"""
-            Eres un experto en BDD (Behavior Driven Development) y Gherkin.
-            Tu tarea es transformar los Criterios de Aceptación tradicionales de la siguiente Historia de Usuario en escenarios Gherkin profesionales.
-
-            Título: {story.get('nombre', '')}
-            Criterios Originales: {json.dumps(story.get('criterios', []))}
-
-            REGLAS:
-            1. Crea UN escenario Gherkin por cada criterio de aceptación original.
-            2. Usa palabras clave: Escenario, Dado, Cuando, Entonces, Y.
-            3. Mantén el idioma en ESPAÑOL.
-            4. Cada escenario debe ser una cadena independiente en la lista de respuesta.
-            5. Agrega saltos de línea (\n) dentro de cada cadena para separar Dado, Cuando y Entonces.
-
-            RESPUESTA:
-            Devuelve un JSON estrictamente con esta estructura:
-            {{
-                "criterios_gherkin": [
-                    "Escenario: Búsqueda exitosa\\nDado que estoy en el home\\nCuando busco \"celular\"\\nEntonces veo resultados",
-                    "Escenario: Búsqueda sin resultados\\nDado que estoy en el home\\nCuando busco \"xyz123\"\\nEntonces veo mensaje de error"
-                ]
-            }}
-            """
-            response = await self.model.generate_content_async(prompt)
+        for story, response in zip(stories, responses):
+            if isinstance(response, Exception):
+                logging.error(f"Error calling Gemini for generate_gherkin: {response}")
+                continue
             try:
-                text = response.text
-                if "```json" in text:
-                    text = text.split("```json")[1].split("```")[0]
-                refined_data = json.loads(text.strip())
+                refined_data = orjson.loads(_strip_fences(response))
                 
                 # Combinamos con los datos originales para el preview
                 refined_stories.append({
@@ -138,34 +234,22 @@ class RefinementService:
         if not stories:
             return []
 
+        prompts = [
+            ESTIMATE_PROMPT
+            + f"Título: {story.get('nombre', '')}\n"
+            + f"Descripción: {story.get('descripcion', '')}\n"
+            + f"Criterios: {json.dumps(story.get('criterios', []))}"
+            for story in stories
+        ]
+
+        responses = await self._generate_many(prompts)
         refined_stories = []
-        for story in stories:
-            prompt = f"""
-            Eres un experto en estimación de software usando Puntos de Historia (escala Fibonacci: 1, 2, 3, 5, 8, 13, 21).
-            Analiza la complejidad de esta Historia de Usuario:
-
-            Título: {story.get('nombre', '')}
-            Descripción: {story.get('descripcion', '')}
-            Criterios: {json.dumps(story.get('criterios', []))}
-
-            Considera:
-            1. Complejidad técnica.
-            2. Esfuerzo de implementación.
-            3. Ambigüedad/Incertidumbre.
-
-            RESPUESTA:
-            Devuelve un JSON con esta estructura:
-            {{
-                "story_points": 5,
-                "justificacion": "Breve explicación de por qué este puntaje"
-            }}
-            """
-            response = await self.model.generate_content_async(prompt)
+        for story, response in zip(stories, responses):
+            if isinstance(response, Exception):
+                logging.error(f"Error calling Gemini for estimate_points: {response}")
+                continue
             try:
-                text = response.text
-                if "```json" in text:
-                    text = text.split("```json")[1].split("```")[0]
-                refined_data = json.loads(text.strip())
+                refined_data = orjson.loads(_strip_fences(response))
                 
                 refined_stories.append({
                     "id": str(story['_id']),
@@ -182,37 +266,17 @@ class RefinementService:
 
     async def detect_duplicates(self, story_ids: List[str]) -> List[dict]:
         # En este caso, analizamos el conjunto completo enviado
-        stories = await self.get_stories_by_ids(story_ids)
+        stories = await self.get_stories_by_ids(story_ids, {"nombre": 1, "descripcion": 1})
         if len(stories) < 2:
             return []
 
         # Construir una lista simplificada para el prompt
         stories_summary = [{"id": str(s['_id']), "nombre": s.get('nombre'), "descripcion": s.get('descripcion')} for s in stories]
 
-        prompt = f"""
-        Analiza estas Historias de Usuario e identifica posibles duplicados o redundancias semánticas.
-
-        Historias:
-        {json.dumps(stories_summary)}
-
-        RESPUESTA:
-        Devuelve un JSON con una lista de grupos de duplicados:
-        {{
-            "duplicados": [
-                {{
-                    "ids": ["id1", "id2"],
-                    "razon": "Explicación de por qué son duplicados"
-                }}
-              ]
-        }}
-        Si no hay duplicados, devuelve una lista vacía.
-        """
-        response = await self.model.generate_content_async(prompt)
+        prompt = DUPLICATES_PROMPT + json.dumps(stories_summary)
+        response = await self.model.generate_content_async(prompt, generation_config=GENERATION_CONFIG)
         try:
-            text = response.text
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0]
-            return json.loads(text.strip())
+            return orjson.loads(_strip_fences(response.text))
         except Exception as e:
             logging.error(f"Error parsing Gemini response for detect_duplicates: {e}")
             return {"duplicados": []}
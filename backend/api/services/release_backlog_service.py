@@ -8,14 +8,16 @@ from __future__ import annotations
 import os, json, logging, anyio
 import time
 from typing import List, Tuple
-from datetime import datetime # ¡IMPORTAR datetime aquí!
+from datetime import datetime, timezone
 
 import google.generativeai as genai
 from fastapi import HTTPException
 from bson import ObjectId
+from pymongo import ReturnDocument
 from pymongo.errors import BulkWriteError
 
 from ...app.db import db
+from .gemini import get_model
 from ...app.schemas import UserStory, DependencyGraph, ReleaseBacklog # <--- Asegúrate de que UserStory, DependencyGraph, ReleaseBacklog vengan de models
 from ...api.schemas.responses import ReleaseBacklogOut # Para el retorno del servicio
 
@@ -86,9 +88,8 @@ class ReleaseBacklogService:
         dependency_graph_doc = await db.dependencies_graph.find_one(
             {"project_id": pid}
         )
-        # Si DependencyGraph fuera un MongoModel, podría inicializarse directamente con el dict de MongoDB
-        # Pero si es BaseModel (como lo mostraste en schemas/responses.py), está bien así.
-        dependencies_graph = DependencyGraph(**dependency_graph_doc) if dependency_graph_doc else None
+        # Solo lo escriben DependencyService y el CRUD, ambos con pares ya validados
+        dependencies_graph = DependencyGraph.from_trusted_mongo(dependency_graph_doc) if dependency_graph_doc else None
 
 
         if not dependencies_graph:
@@ -131,38 +132,27 @@ class ReleaseBacklogService:
         release_backlog_data_for_db = {
             "project_id": pid, # ObjectId
             "us_codes": valid_backlog_codes,
-            "generated_at": datetime.utcnow(),
+            "generated_at": datetime.now(timezone.utc),
             "total_prompt_tokens": prompt_t,
             "total_completion_tokens": completion_t,
             "total_processing_time_ms": proc_t,
         }
 
-        # Usar replace_one con upsert=True para insertar o actualizar el backlog
+        # Usar find_one_and_replace con upsert=True para insertar o actualizar el backlog
+        # y obtener su _id en el mismo round-trip
         logging.info(f"Guardando Release Backlog con {len(valid_backlog_codes)} códigos en la base de datos...")
-        result = await db.release_backlogs.replace_one(
+        saved = await db.release_backlogs.find_one_and_replace(
             {"project_id": pid},
             release_backlog_data_for_db,
-            upsert=True
+            projection={"_id": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
         )
-        logging.info(f"Resultado de guardado en DB: {'Upsertado' if result.upserted_id else 'Actualizado'}")
 
         # 5. Preparar el documento para la respuesta de la API (ReleaseBacklogOut)
         # Aquí 'id' es requerido y 'project_id' debe ser string
         final_backlog_doc_for_api = release_backlog_data_for_db.copy() # Copiar para no modificar el dict que se va a la DB
-
-        if result.upserted_id:
-            final_backlog_doc_for_api["_id"] = result.upserted_id # El nuevo ID generado por MongoDB
-        else:
-            # Si no se insertó uno nuevo (porque ya existía), obtenemos el _id del documento que se actualizó.
-            # No podemos usar el 'pid' directamente como '_id' porque 'pid' es el ID del PROYECTO, no del ReleaseBacklog.
-            # Debemos obtener el ID del documento de ReleaseBacklog.
-            existing_doc_from_db = await db.release_backlogs.find_one({"project_id": pid}, {"_id": 1})
-            if existing_doc_from_db:
-                final_backlog_doc_for_api["_id"] = existing_doc_from_db["_id"]
-            else:
-                # Esto es un fallback extremo, no debería pasar con upsert=True
-                logging.error(f"Error crítico: No se pudo obtener el _id del Release Backlog para el proyecto {project_id} después de upsert.")
-                raise HTTPException(status_code=500, detail="Error interno al procesar el Release Backlog (ID no encontrado).")
+        final_backlog_doc_for_api["_id"] = saved["_id"]
 
         # Convertir ObjectId a string para el modelo de respuesta Pydantic
         final_backlog_doc_for_api["id"] = str(final_backlog_doc_for_api["_id"])
@@ -193,7 +183,7 @@ class ReleaseBacklogService:
         Retorna la lista de códigos de HU, los tokens de entrada, los tokens de salida
         y el tiempo de procesamiento en ms.
         """
-        model = genai.GenerativeModel(MODEL)
+        model = get_model(MODEL)
         prompt_tokens = 0
         completion_tokens = 0
         processing_time_ms = 0.0
@@ -7,14 +7,18 @@ from __future__ import annotations
 
 import os, json, logging, anyio
 import time
+from dataclasses import dataclass
+from operator import itemgetter
 from typing import List, Dict, Any
-from datetime import datetime
+from datetime import datetime, date, timedelta, timezone
 
 import google.generativeai as genai
 from fastapi import HTTPException
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 from ...app.db import db
+from .gemini import get_model
 from ...app.schemas import ProjectConfig
 from ...api.schemas.responses import ReleasePlanningOut
 
@@ -119,6 +123,47 @@ DATOS DE LAS HISTORIAS:
 {stories_data}
 """
 
+_get_sp = itemgetter("story_points")
+
+
+@dataclass(frozen=True, slots=True)
+class ParsedProjectConfig:
+    """Configuración del proyecto ya normalizada para los validadores."""
+    num_devs: int
+    sprint_duration_weeks: int
+    team_capacity_hours: float
+    team_velocity: int
+    release_target_date: date | None
+
+
+def _parse_project_config(cfg: Dict[str, Any] | ParsedProjectConfig) -> ParsedProjectConfig:
+    """Parsea una sola vez la configuración cruda (dict de MongoDB o de _get_project_config)."""
+    if isinstance(cfg, ParsedProjectConfig):
+        return cfg
+
+    target_date = None
+    raw_target = cfg.get("release_target_date")
+    if raw_target:
+        try:
+            # Puede venir como string ISO o como datetime/date de MongoDB
+            if isinstance(raw_target, str):
+                target_date = datetime.fromisoformat(raw_target.replace('Z', '+00:00')).date()
+            elif isinstance(raw_target, datetime):
+                target_date = raw_target.date()
+            elif isinstance(raw_target, date):
+                target_date = raw_target
+        except ValueError as e:
+            logging.getLogger(__name__).warning(f"No se pudo parsear la fecha objetivo: {e}")
+
+    return ParsedProjectConfig(
+        num_devs=cfg.get("num_devs", 1),
+        sprint_duration_weeks=cfg.get("sprint_duration", 2),
+        team_capacity_hours=cfg.get("team_capacity") or 0,
+        team_velocity=cfg.get("team_velocity", 0),
+        release_target_date=target_date,
+    )
+
+
 class ReleasePlanningService:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
@@ -144,6 +189,8 @@ class ReleasePlanningService:
                     detail="Configuración del proyecto no encontrada. Configure el proyecto primero."
                 )
 
+            parsed_config = _parse_project_config(project_config)
+
             # 2. Obtener historias de usuario del proyecto
             user_stories = await self._get_project_stories(project_id)
             if not user_stories:
@@ -156,10 +203,10 @@ class ReleasePlanningService:
 
             # 3. Preparar datos para la IA
             stories_data = self._format_stories_for_ai(user_stories)
-            total_story_points = sum(story.get('story_points', 0) for story in user_stories)
+            total_story_points = sum(map(_get_sp, user_stories))
 
             # Calcular sprints necesarios teóricamente
-            team_velocity = project_config["team_velocity"]
+            team_velocity = parsed_config.team_velocity
             estimated_sprints_needed = max(1, round(total_story_points / team_velocity)) if team_velocity > 0 else 1
 
             self.logger.info(f"📊 Enviando {len(user_stories)} historias de usuario a la IA para planificación de release")
@@ -191,17 +238,17 @@ class ReleasePlanningService:
             if release_plan and "releases" in release_plan:
                 total_stories_in_plan = 0
                 for release in release_plan["releases"]:
-                    for sprint in release.get("sprints", []):
-                        total_stories_in_plan += len(sprint.get("stories", []))
+                    for sprint in release.get("sprints") or []:
+                        total_stories_in_plan += len(sprint.get("stories") or [])
                 
-                total_sprints = sum(len(release.get("sprints", [])) for release in release_plan["releases"])
+                total_sprints = sum(len(release.get("sprints") or []) for release in release_plan["releases"])
                 self.logger.info(f"Plan generado: {len(release_plan['releases'])} releases, {total_sprints} sprints, {total_stories_in_plan} historias incluidas")
 
                 if total_stories_in_plan < len(user_stories):
                     self.logger.warning(f"FALTAN HISTORIAS: Enviadas {len(user_stories)}, incluidas en plan {total_stories_in_plan}")
 
             # Validar viabilidad del plan generado
-            plan_viability = self._validate_generated_plan_viability_multi_release(release_plan, project_config)
+            plan_viability = self._validate_generated_plan_viability_multi_release(release_plan, parsed_config)
             if not plan_viability["is_viable"]:
                 self.logger.warning(f"🚫 PLAN GENERADO NO VIABLE: {plan_viability['reason']}")
                 # Actualizar el análisis del proyecto
@@ -235,19 +282,23 @@ class ReleasePlanningService:
                 "overall_risks": release_plan.get("overall_risks", []),
                 "overall_recommendations": release_plan.get("overall_recommendations", []),
                 "suggested_config": release_plan.get("suggested_config"),
-                "generated_at": datetime.utcnow(),
+                "generated_at": datetime.now(timezone.utc),
                 "total_prompt_tokens": release_plan.get("usage", {}).get("prompt_tokens", 0),
                 "total_completion_tokens": release_plan.get("usage", {}).get("completion_tokens", 0),
                 "total_processing_time_ms": processing_time
             }
 
-            # Eliminar plan anterior si existe (solo un plan por proyecto)
-            await db.release_plans.delete_many({"project_id": ObjectId(project_id)})
-
-            result = await db.release_plans.insert_one(plan_doc)
+            # Reemplazar el plan anterior si existe (solo un plan por proyecto) en un solo round-trip
+            saved = await db.release_plans.find_one_and_replace(
+                {"project_id": ObjectId(project_id)},
+                plan_doc,
+                projection={"_id": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
 
             return ReleasePlanningOut(
-                id=str(result.inserted_id),
+                id=str(saved["_id"]),
                 project_id=project_id,
                 releases=plan_doc["releases"],
                 num_releases=num_releases,
@@ -319,7 +370,14 @@ class ReleasePlanningService:
 
     async def _get_project_stories(self, project_id: str) -> List[Dict[str, Any]]:
         """Obtiene todas las historias de usuario del proyecto."""
-        stories_cursor = db.user_stories.find({"project_id": ObjectId(project_id)})
+        stories_cursor = db.user_stories.find(
+            {"project_id": ObjectId(project_id)},
+            {
+                "project_id": 1, "code": 1, "epica": 1, "nombre": 1, "descripcion": 1,
+                "criterios": 1, "priority": 1, "story_points": 1, "dor": 1, "status": 1,
+                "deps": 1, "ai": 1, "created_at": 1
+            }
+        )
         stories = await stories_cursor.to_list(length=None)
 
         # Convertir ObjectId y datetime para serialización
@@ -381,21 +439,17 @@ Criterios: {', '.join(story['criterios'])}
     ) -> Dict[str, Any]:
         """Genera el plan de release usando IA dividido en múltiples releases."""
         # Calcular fechas realistas para el primer sprint
-        from datetime import datetime, timedelta
-        today = datetime.now()
+        today = date.today()
 
         # El primer sprint comienza el próximo lunes (o hoy si es lunes)
         days_until_monday = (7 - today.weekday()) % 7
-        if days_until_monday == 0:  # Ya es lunes
-            first_sprint_start = today
-        else:
-            first_sprint_start = today + timedelta(days=days_until_monday)
+        first_sprint_start = today + timedelta(days=days_until_monday)
 
         sprint_duration_weeks = project_config["sprint_duration"]
         first_sprint_end = first_sprint_start + timedelta(weeks=sprint_duration_weeks, days=-1)  # -1 para incluir el último día
 
-        sprint_start_date = first_sprint_start.strftime("%Y-%m-%d")
-        sprint_end_date = first_sprint_end.strftime("%Y-%m-%d")
+        sprint_start_date = first_sprint_start.isoformat()
+        sprint_end_date = first_sprint_end.isoformat()
 
         prompt = RELEASE_PLANNING_PROMPT.format(
             num_devs=project_config["num_devs"],
@@ -416,8 +470,10 @@ Criterios: {', '.join(story['criterios'])}
         )
 
         try:
-            model = genai.GenerativeModel(MODEL)
-            response = model.generate_content(prompt, request_options={"timeout": 10000})
+            model = get_model(MODEL)
+            response = await anyio.to_thread.run_sync(
+                lambda: model.generate_content(prompt, request_options={"timeout": 10000})
+            )
 
             # Limpiar la respuesta de bloques de código markdown
             cleaned_response = self._clean_ai_response(response.text.strip())
@@ -679,8 +735,10 @@ Criterios: {', '.join(story['criterios'])}
         """
 
         try:
-            model = genai.GenerativeModel(MODEL)
-            response = model.generate_content(regeneration_prompt, request_options={"timeout": 10000})
+            model = get_model(MODEL)
+            response = await anyio.to_thread.run_sync(
+                lambda: model.generate_content(regeneration_prompt, request_options={"timeout": 10000})
+            )
 
             cleaned_response = self._clean_ai_response(response.text)
 
@@ -695,10 +753,11 @@ Criterios: {', '.join(story['criterios'])}
             self.logger.error(f"Error en regeneración: {e}")
             return partial_plan
 
-    def _validate_plan_viability(self, release_plan: Dict[str, Any], project_config: Dict[str, Any], total_story_points: int, estimated_sprints: int) -> Dict[str, Any]:
+    def _validate_plan_viability(self, release_plan: Dict[str, Any], project_config: Dict[str, Any] | ParsedProjectConfig, total_story_points: int, estimated_sprints: int) -> Dict[str, Any]:
         """
         Valida si el plan generado por la IA cumple con las restricciones de viabilidad.
         """
+        config = _parse_project_config(project_config)
         issues = []
         recommendations = []
         adjustments = []
@@ -713,7 +772,7 @@ Criterios: {', '.join(story['criterios'])}
             }
 
         sprints = release_plan.get("sprints", [])
-        team_velocity = project_config["team_velocity"]
+        team_velocity = config.team_velocity
 
         # 1. Verificar que el número de sprints sea razonable
         if len(sprints) > estimated_sprints * 1.5:  # Más del 50% de lo estimado
@@ -731,12 +790,10 @@ Criterios: {', '.join(story['criterios'])}
                 is_viable = False
 
         # 3. Verificar fechas realistas
-        from datetime import datetime, timedelta
-        sprint_duration_weeks = project_config["sprint_duration"]
-        target_date = datetime.fromisoformat(project_config["release_target_date"])
+        target_date = config.release_target_date
 
-        if sprints:
-            last_sprint_end = datetime.fromisoformat(sprints[-1]["end_date"]) if "end_date" in sprints[-1] else None
+        if sprints and target_date:
+            last_sprint_end = datetime.fromisoformat(sprints[-1]["end_date"]).date() if "end_date" in sprints[-1] else None
             if last_sprint_end and last_sprint_end > target_date:
                 weeks_over = (last_sprint_end - target_date).days // 7
                 issues.append(f"Fecha límite excedida por {weeks_over} semanas")
@@ -767,93 +824,6 @@ Criterios: {', '.join(story['criterios'])}
             "adjustments": adjustments
         }
 
-    def _validate_generated_plan_viability(self, release_plan: Dict[str, Any], project_config: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Valida si el plan de release GENERADO por la IA cabe en la fecha límite.
-        Esta es la validación REAL, no teórica.
-        """
-        from datetime import datetime, date
-        issues = []
-        recommendations = []
-        risks = []
-        is_viable = True
-
-        if not release_plan or "sprints" not in release_plan or not release_plan["sprints"]:
-            return {
-                "is_viable": False,
-                "reason": "Plan no generado correctamente",
-                "issues": ["Plan de release no generado"],
-                "recommendations": ["Vuelva a generar el plan"],
-                "risks": []
-            }
-
-        # Obtener la fecha del último sprint
-        last_sprint = release_plan["sprints"][-1]
-        last_sprint_end = last_sprint.get("end_date", "")
-
-        # Obtener fecha objetivo del proyecto
-        target_date_str = project_config.get("release_target_date", "")
-        if not target_date_str or not last_sprint_end:
-            return {
-                "is_viable": True,  # No podemos validar sin fechas
-                "reason": "No hay fechas para validar",
-                "issues": [],
-                "recommendations": [],
-                "risks": []
-            }
-
-        try:
-            # Parsear fechas
-            if isinstance(target_date_str, str):
-                target_date = datetime.fromisoformat(target_date_str.replace('Z', '+00:00')).date()
-            else:
-                target_date = target_date_str.date() if hasattr(target_date_str, 'date') else target_date_str
-
-            project_end_date = datetime.fromisoformat(last_sprint_end).date()
-
-            # Comparar fechas
-            if project_end_date > target_date:
-                is_viable = False
-                days_over = (project_end_date - target_date).days
-                weeks_over = days_over // 7
-
-                issues.append(f"Proyecto termina {days_over} días ({weeks_over} semanas) después de la fecha límite")
-                recommendations.append("Reducir el alcance del proyecto o extender la fecha objetivo")
-                recommendations.append("Aumentar la velocidad del equipo")
-                recommendations.append("Reorganizar las historias en los sprints")
-
-                risks.append({
-                    "level": "CRITICAL",
-                    "description": f"Fecha límite excedida por {days_over} días - proyecto destinado al fracaso",
-                    "mitigation": "Negociar extensión de fecha límite con stakeholders"
-                })
-
-            elif project_end_date == target_date:
-                recommendations.append("Proyecto ajustado justo a la fecha límite - considere buffer adicional")
-                risks.append({
-                    "level": "MEDIUM",
-                    "description": "Proyecto termina exactamente en la fecha límite - sin margen de error",
-                    "mitigation": "Agregar buffer de al menos 1-2 semanas"
-                })
-
-            else:
-                # Proyecto termina ANTES de la fecha límite - es viable
-                days_early = (target_date - project_end_date).days
-                self.logger.info(f"✅ Proyecto viable: termina {days_early} días antes de la fecha límite")
-
-        except (ValueError, TypeError, AttributeError) as e:
-            self.logger.warning(f"No se pudo validar fechas del plan: {e}")
-            # No fallar si no podemos validar fechas
-            is_viable = True
-
-        return {
-            "is_viable": is_viable,
-            "reason": "; ".join(issues) if issues else "Plan viable",
-            "issues": issues,
-            "recommendations": recommendations,
-            "risks": risks
-        }
-
     def _check_and_fix_duplicate_stories(self, release_plan: Dict[str, Any], user_stories: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Verifica si hay historias duplicadas en el plan y las corrige.
@@ -947,23 +917,23 @@ Criterios: {', '.join(story['criterios'])}
         self,
         total_story_points: int,
         team_velocity: int,
-        project_config: Dict[str, Any],
+        project_config: Dict[str, Any] | ParsedProjectConfig,
         estimated_sprints: int
     ) -> Dict[str, Any]:
         """
         Valida si un proyecto es viable para generar un plan de release.
         Considera velocidad del equipo, número de devs, duración de sprints y fecha límite.
         """
-        from datetime import datetime, date
+        config = _parse_project_config(project_config)
         issues = []
         recommendations = []
         risks = []
         is_viable = True
 
         # Extraer parámetros del proyecto
-        num_devs = project_config.get("num_devs", 1)
-        sprint_duration_weeks = project_config.get("sprint_duration", 2)
-        team_capacity_hours = project_config.get("team_capacity", 0)
+        num_devs = config.num_devs
+        sprint_duration_weeks = config.sprint_duration_weeks
+        team_capacity_hours = config.team_capacity_hours
 
         # Cálculo más preciso: semanas totales necesarias
         weeks_needed = estimated_sprints * sprint_duration_weeks
@@ -972,32 +942,21 @@ Criterios: {', '.join(story['criterios'])}
         target_date_viable = True
         weeks_available = 0
 
-        if "release_target_date" in project_config:
-            try:
-                # Parsear fecha objetivo (puede venir como string ISO o datetime)
-                target_date_str = project_config["release_target_date"]
-                if isinstance(target_date_str, str):
-                    target_date = datetime.fromisoformat(target_date_str.replace('Z', '+00:00')).date()
-                else:
-                    # Si viene como datetime de MongoDB
-                    target_date = target_date_str.date() if hasattr(target_date_str, 'date') else target_date_str
-
-                today = date.today()
-                weeks_available = max(0, (target_date - today).days // 7)
-
-                if weeks_needed > weeks_available:
-                    target_date_viable = False
-                    is_viable = False
-                    issues.append(f"Fecha límite insuficiente: necesita {weeks_needed} semanas, tiene {weeks_available} disponibles")
-                    recommendations.append("Extender la fecha objetivo o reducir significativamente el alcance del proyecto")
-                    risks.append({
-                        "level": "CRITICAL",
-                        "description": f"Fecha límite irrealista - proyecto necesita {weeks_needed} semanas pero solo tiene {weeks_available}",
-                        "mitigation": "Negociar nueva fecha límite con stakeholders o reducir scope drásticamente"
-                    })
+        target_date = config.release_target_date
+        if target_date:
+            today = date.today()
+            weeks_available = max(0, (target_date - today).days // 7)
 
-            except (ValueError, TypeError, AttributeError) as e:
-                self.logger.warning(f"No se pudo validar fecha límite: {e}")
+            if weeks_needed > weeks_available:
+                target_date_viable = False
+                is_viable = False
+                issues.append(f"Fecha límite insuficiente: necesita {weeks_needed} semanas, tiene {weeks_available} disponibles")
+                recommendations.append("Extender la fecha objetivo o reducir significativamente el alcance del proyecto")
+                risks.append({
+                    "level": "CRITICAL",
+                    "description": f"Fecha límite irrealista - proyecto necesita {weeks_needed} semanas pero solo tiene {weeks_available}",
+                    "mitigation": "Negociar nueva fecha límite con stakeholders o reducir scope drásticamente"
+                })
 
         # Validar capacidad del equipo
         if team_capacity_hours > 0 and num_devs > 0:
@@ -1054,7 +1013,7 @@ Criterios: {', '.join(story['criterios'])}
                 })
 
         # Si no hay fecha límite configurada, usar criterio de sprints como fallback
-        if "release_target_date" not in project_config and estimated_sprints > 10:
+        if not target_date and estimated_sprints > 10:
             issues.append(f"Sin fecha límite definida y proyecto requiere {estimated_sprints} sprints")
             recommendations.append("Definir una fecha objetivo realista para el proyecto")
 
@@ -1074,12 +1033,12 @@ Criterios: {', '.join(story['criterios'])}
             }
         }
 
-    def _validate_generated_plan_viability(self, release_plan: Dict[str, Any], project_config: Dict[str, Any]) -> Dict[str, Any]:
+    def _validate_generated_plan_viability(self, release_plan: Dict[str, Any], project_config: Dict[str, Any] | ParsedProjectConfig) -> Dict[str, Any]:
         """
         Valida si el plan de release GENERADO por la IA cabe en la fecha límite.
         Esta es la validación REAL, no teórica.
         """
-        from datetime import datetime, date
+        config = _parse_project_config(project_config)
         issues = []
         recommendations = []
         risks = []
@@ -1099,8 +1058,8 @@ Criterios: {', '.join(story['criterios'])}
         last_sprint_end = last_sprint.get("end_date", "")
 
         # Obtener fecha objetivo del proyecto
-        target_date_str = project_config.get("release_target_date", "")
-        if not target_date_str or not last_sprint_end:
+        target_date = config.release_target_date
+        if not target_date or not last_sprint_end:
             return {
                 "is_viable": True,  # No podemos validar sin fechas
                 "reason": "No hay fechas para validar",
@@ -1110,12 +1069,6 @@ Criterios: {', '.join(story['criterios'])}
             }
 
         try:
-            # Parsear fechas
-            if isinstance(target_date_str, str):
-                target_date = datetime.fromisoformat(target_date_str.replace('Z', '+00:00')).date()
-            else:
-                target_date = target_date_str.date() if hasattr(target_date_str, 'date') else target_date_str
-
             project_end_date = datetime.fromisoformat(last_sprint_end).date()
 
             # Comparar fechas
@@ -1162,11 +1115,11 @@ Criterios: {', '.join(story['criterios'])}
         }
 
 
-    def _validate_generated_plan_viability_multi_release(self, release_plan: Dict[str, Any], project_config: Dict[str, Any]) -> Dict[str, Any]:
+    def _validate_generated_plan_viability_multi_release(self, release_plan: Dict[str, Any], project_config: Dict[str, Any] | ParsedProjectConfig) -> Dict[str, Any]:
         """
         Valida si el plan de release con MÚLTIPLES RELEASES cabe en la fecha límite.
         """
-        from datetime import datetime, date
+        config = _parse_project_config(project_config)
         issues = []
         recommendations = []
         risks = []
@@ -1196,8 +1149,8 @@ Criterios: {', '.join(story['criterios'])}
         last_sprint_end = last_sprint.get("end_date", "")
 
         # Obtener fecha objetivo del proyecto
-        target_date_str = project_config.get("release_target_date", "")
-        if not target_date_str or not last_sprint_end:
+        target_date = config.release_target_date
+        if not target_date or not last_sprint_end:
             return {
                 "is_viable": True,  # No podemos validar sin fechas
                 "reason": "No hay fechas para validar",
@@ -1207,12 +1160,6 @@ Criterios: {', '.join(story['criterios'])}
             }
 
         try:
-            # Parsear fechas
-            if isinstance(target_date_str, str):
-                target_date = datetime.fromisoformat(target_date_str.replace('Z', '+00:00')).date()
-            else:
-                target_date = target_date_str.date() if hasattr(target_date_str, 'date') else target_date_str
-
             project_end_date = datetime.fromisoformat(last_sprint_end).date()
 
             # Comparar fechas
@@ -1,25 +1,73 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from pymongo import ASCENDING
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
 
-from .db import db, mongo_client
+from .db import db, LLM_CACHE_TTL_SECONDS
 
 # ── Índices ────────────────────────────────────
 INDEX_MAP = {
     "users":        [({"email": ASCENDING}, {"unique": True})],
+    "user_credentials": [({"user_id": ASCENDING}, {"unique": True})],
     "projects":     [({"code":  ASCENDING}, {"unique": True})],
     "user_stories": [({"project_id": ASCENDING}, {}),
                      ({"project_id": ASCENDING, "code": ASCENDING}, {"unique": True})],
     "dependencies": [({"project_id": ASCENDING}, {})],
     "project_configs": [({"project_id": ASCENDING}, {"unique": True})],
+    "llm_cache":    [({"created_at": ASCENDING}, {"expireAfterSeconds": LLM_CACHE_TTL_SECONDS})],
+    # Un plan y un backlog por proyecto: los servicios los guardan con find_one_and_replace + upsert
+    "release_plans":    [({"project_id": ASCENDING}, {"unique": True})],
+    "release_backlogs": [({"project_id": ASCENDING}, {"unique": True})],
 }
 
+# Códigos de Mongo: el índice ya existe con otras opciones / clave duplicada
+INDEX_OPTIONS_CONFLICT = 85
+DUPLICATE_KEY = 11000
+
+# Colecciones que antes del índice único podían acumular varios documentos por proyecto
+ONE_PER_PROJECT = {"release_plans", "release_backlogs"}
+
+async def _drop_superseded_by_project(coll):
+    """Deja solo el documento más reciente (generated_at) de cada proyecto."""
+    pipeline = [
+        {"$sort": {"generated_at": -1}},
+        {"$group": {"_id": "$project_id", "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ]
+    stale = []
+    async for group in db[coll].aggregate(pipeline):
+        stale.extend(group["ids"][1:])
+    if stale:
+        await db[coll].delete_many({"_id": {"$in": stale}})
+        logging.warning(f"{coll}: eliminados {len(stale)} documentos duplicados por proyecto")
+
+async def _create_indexes(coll, specs):
+    models = [IndexModel(list(keys.items()), **opts) for keys, opts in specs]
+    try:
+        await db[coll].create_indexes(models)
+    except OperationFailure as e:
+        if e.code == INDEX_OPTIONS_CONFLICT:
+            # Cambió un TTL configurable (p. ej. LLM_CACHE_TTL_SECONDS): se ajusta en el índice existente
+            for keys, opts in specs:
+                if "expireAfterSeconds" in opts:
+                    await db.command("collMod", coll, index={
+                        "keyPattern": keys,
+                        "expireAfterSeconds": opts["expireAfterSeconds"],
+                    })
+        elif e.code == DUPLICATE_KEY and coll in ONE_PER_PROJECT:
+            # Migración única: quedan duplicados de cuando se insertaba sin índice único
+            await _drop_superseded_by_project(coll)
+        else:
+            raise
+        await db[coll].create_indexes(models)
+
 async def init_indexes():
-    for coll, specs in INDEX_MAP.items():
-        for keys, opts in specs:
-            await db[coll].create_index(list(keys.items()), **opts)
+    # Un createIndexes por colección y todas las colecciones en paralelo
+    await asyncio.gather(*(_create_indexes(coll, specs) for coll, specs in INDEX_MAP.items()))
     logging.info("✔ MongoDB indexes ready")
 
 # ── Tags Metadata ──────────────────────────────
@@ -54,9 +102,33 @@ tags_metadata = [
     },
 ]
 
+# ── Lifespan ───────────────────────────────────
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Import routers here to avoid circular imports
+    from ..api.routers.llm  import api_router as main_router
+    from ..api.routers.crud import router     as crud_router
+    from ..api.routers.extra import router    as extra_router
+    from ..api.routers.auth import router     as auth_router
+    from ..api.routers.refinement import router as refinement_router
+    
+    # Include routers
+    app.include_router(main_router, prefix="/api")
+    app.include_router(crud_router,  prefix="/api")
+    app.include_router(extra_router, prefix="/api")
+    app.include_router(auth_router, prefix="/api")
+    app.include_router(refinement_router, prefix="/api")
+    
+    await init_indexes()
+    yield
+    # mongo_client es el singleton de db.py que importan todos los servicios: no se
+    # cierra aquí porque un cliente cerrado no se puede reutilizar en otro lifespan
+    # del mismo proceso (p. ej. varios TestClient); sus sockets se liberan al salir.
+
 # ── FastAPI ────────────────────────────────────
 # Configure for Cloud Run - trust proxy headers
 app = FastAPI(
+    lifespan=lifespan,
     title="SprintMind API",
     description="""
 API para la gestión de proyectos ágiles con soporte de IA. 
@@ -105,21 +177,3 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-@app.on_event("startup")
-async def startup():
-    # Import routers here to avoid circular imports
-    from ..api.routers.llm  import api_router as main_router
-    from ..api.routers.crud import router     as crud_router
-    from ..api.routers.extra import router    as extra_router
-    from ..api.routers.auth import router     as auth_router
-    from ..api.routers.refinement import router as refinement_router
-    
-    # Include routers
-    app.include_router(main_router, prefix="/api")
-    app.include_router(crud_router,  prefix="/api")
-    app.include_router(extra_router, prefix="/api")
-    app.include_router(auth_router, prefix="/api")
-    app.include_router(refinement_router, prefix="/api")
-    
-    await init_indexes()
\ No newline at end of file
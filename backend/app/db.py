@@ -1,4 +1,6 @@
+import importlib.util
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -10,8 +12,33 @@ load_dotenv(env_path)
 # Support both MONGODB_URI (preferred) and MONGO_URI (legacy)
 MONGO_URI = os.getenv("MONGODB_URI") or os.getenv("MONGO_URI", "mongodb://localhost:27017")
 
+def _default_compressors() -> str:
+    """zstd solo si pymongo puede usarlo; si no, pymongo avisa con un UserWarning al crear el cliente."""
+    # Mismo módulo que carga pymongo para zstd (pymongo[zstd] instala backports.zstd)
+    zstd_module = "compression.zstd" if sys.version_info >= (3, 14) else "backports.zstd"
+    try:
+        have_zstd = importlib.util.find_spec(zstd_module) is not None
+    except ModuleNotFoundError:  # falta el paquete padre
+        have_zstd = False
+    return "zstd,zlib" if have_zstd else "zlib"
+
 print(f"[DB] Connecting to MongoDB: {MONGO_URI[:30]}...")
-mongo_client = AsyncIOMotorClient(MONGO_URI)
+# Un único cliente (y su pool) compartido por toda la aplicación
+mongo_client = AsyncIOMotorClient(
+    MONGO_URI,
+    maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "200")),
+    minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "20")),
+    serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "3000")),
+    retryWrites=True,
+    # Compresión en el cable: zstd si está instalado, si no zlib (siempre disponible)
+    compressors=os.getenv("MONGO_COMPRESSORS") or _default_compressors(),
+    zlibCompressionLevel=6,
+    # Las fechas se guardan en UTC y se leen como datetime con zona, igual que al escribirlas
+    tz_aware=True,
+)
 db           = mongo_client["tdp_prototype"]
 
-__all__ = ["db", "mongo_client"]
+# Vida de las respuestas cacheadas en llm_cache (ver api/services/llm_cache.py)
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+__all__ = ["db", "mongo_client", "LLM_CACHE_TTL_SECONDS"]
@@ -0,0 +1,21 @@
+# backend/app/json_fast.py
+"""
+Serializador orjson con las opciones y el `default` fijados una sola vez
+al importar el módulo.
+"""
+from functools import partial
+from typing import Any
+
+import orjson
+from bson import ObjectId
+
+
+def _default(obj: Any) -> str:
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+_OPTS = orjson.OPT_NON_STR_KEYS
+
+dumps = partial(orjson.dumps, default=_default, option=_OPTS)
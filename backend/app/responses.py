@@ -0,0 +1,16 @@
+# backend/app/responses.py
+"""
+Respuesta JSON serializada con orjson para las rutas sin response_model.
+Con response_model FastAPI ya serializa a bytes con Pydantic, así que esta
+clase se usa solo donde la ruta devuelve dicts o modelos ya construidos.
+"""
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from .json_fast import dumps
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,37 +1,109 @@
-from datetime import datetime, date
-from typing import Annotated, Optional, Literal, List
+from dataclasses import dataclass
+from datetime import datetime, date, timezone
+from typing import Annotated, Optional, Literal, List, get_args
 from bson import ObjectId
-from pydantic import Field, EmailStr, BaseModel
-from fastapi_crudrouter_mongodb import MongoModel, MongoObjectId
+from pydantic import ConfigDict, Field, EmailStr, TypeAdapter
+from pydantic_core import core_schema
+from fastapi_crudrouter_mongodb import MongoModel
 
-class User(MongoModel):
-    id: Annotated[ObjectId, MongoObjectId] | None = Field(default=None, alias="_id", description="ID único del usuario")
+class _ObjectIdSchema:
+    """Esquema de ObjectId: las instancias que vienen de Mongo se aceptan con un
+    isinstance dentro de pydantic-core; solo las cadenas (JSON, query) pasan por Python."""
+
+    @staticmethod
+    def _from_str(value: str) -> ObjectId:
+        if not ObjectId.is_valid(value):
+            raise ValueError("Invalid ObjectId")
+        return ObjectId(value)
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source_type, handler) -> core_schema.CoreSchema:
+        from_str = core_schema.no_info_after_validator_function(cls._from_str, core_schema.str_schema())
+        return core_schema.json_or_python_schema(
+            json_schema=from_str,
+            python_schema=core_schema.union_schema([core_schema.is_instance_schema(ObjectId), from_str]),
+            serialization=core_schema.to_string_ser_schema(),
+        )
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, _core_schema, handler):
+        return handler(core_schema.str_schema())
+
+PyObjectId = Annotated[ObjectId, _ObjectIdSchema]
+
+def _utcnow() -> datetime:
+    """Marca de tiempo por defecto (UTC, con zona); reemplaza a datetime.utcnow, obsoleto."""
+    return datetime.now(timezone.utc)
+
+# Roles de usuario: única definición compartida por modelos, requests y responses
+Role = Literal["student", "advisor", "po", "admin"]
+ROLES = frozenset(get_args(Role))
+
+class MongoDoc(MongoModel):
+    """Base de los modelos persistidos en Mongo."""
+
+    # El esquema de pydantic-core se construye en el primer uso, no al importar.
+    # Las instancias ya construidas no se revalidan (p. ej. al pasar por el
+    # response_model de FastAPI ni cuando van anidadas en otro modelo).
+    model_config = ConfigDict(defer_build=True, revalidate_instances="never")
+
+    @classmethod
+    def from_mongo(cls, data: dict):
+        """Construye el modelo desde un documento leído de Mongo. Se valida siempre:
+        hay documentos antiguos o escritos a mano que no cumplen el esquema."""
+        if not data:
+            return data
+        return cls.model_validate(data)
+
+    @classmethod
+    def from_trusted_mongo(cls, data: dict):
+        """Construye el modelo sin validar, para colecciones que solo se escriben con
+        datos ya validados por la API. Los alias (`_id`, camelCase) se resuelven aquí."""
+        if not data:
+            return data
+        values = {}
+        for name, field in cls.model_fields.items():
+            if field.alias in data:
+                values[name] = data[field.alias]
+            elif name in data:
+                values[name] = data[name]
+        return cls.model_construct(**values)
+
+class User(MongoDoc):
+    id: PyObjectId | None = Field(default=None, alias="_id", description="ID único del usuario")
     email: EmailStr = Field(..., description="Correo electrónico del usuario", example="user@example.com")
     name: str = Field(..., description="Nombre completo del usuario", example="Juan Pérez")
-    password_hash: str = Field(..., description="Contraseña hasheada (bcrypt)")
-    role: Literal["student", "advisor", "po", "admin"] = Field(..., description="Rol asignado al usuario")
-    created_at: datetime = Field(default_factory=datetime.utcnow, description="Fecha de creación de la cuenta")
+    role: Role = Field(..., description="Rol asignado al usuario")
+    created_at: datetime = Field(default_factory=_utcnow, description="Fecha de creación de la cuenta")
+
+class UserCredentials(MongoDoc):
+    """Hash de contraseña en su propia colección: las lecturas de `users` nunca lo traen."""
+    id: PyObjectId | None = Field(default=None, alias="_id", description="ID único de la credencial")
+    user_id: PyObjectId = Field(..., description="ID del usuario al que pertenece")
+    password_hash: str = Field(..., description="Contraseña hasheada")
+    algo: str = Field("bcrypt", description="Algoritmo del hash")
+    updated_at: datetime = Field(default_factory=_utcnow, description="Fecha del último cambio de contraseña")
 
-class Project(MongoModel):
-    id: Annotated[ObjectId, MongoObjectId] | None = Field(default=None, alias="_id", description="ID único del proyecto")
+class Project(MongoDoc):
+    id: PyObjectId | None = Field(default=None, alias="_id", description="ID único del proyecto")
     code: str = Field(..., description="Código corto del proyecto", example="SM-2024")
     name: str = Field(..., description="Nombre del proyecto", example="SprintMind Backend")
     description: Optional[str] = Field(None, description="Descripción detallada del proyecto")
-    owner_id: Annotated[ObjectId, MongoObjectId] | None = Field(None, description="ID del usuario dueño del proyecto")
-    created_at: datetime = Field(default_factory=datetime.utcnow, description="Fecha de creación del proyecto")
+    owner_id: PyObjectId | None = Field(None, description="ID del usuario dueño del proyecto")
+    created_at: datetime = Field(default_factory=_utcnow, description="Fecha de creación del proyecto")
     total_prompt_tokens: int = Field(default=0, description="Total de tokens de prompt usados por la IA")
     total_completion_tokens: int = Field(default=0, description="Total de tokens de completitud generados por la IA")
     total_processing_time_ms: float = Field(default=0.0, description="Tiempo total de procesamiento de IA en milisegundos")
 
-class UserStory(MongoModel):
-    id: Annotated[ObjectId, MongoObjectId] | None = Field(default=None, alias="_id", description="ID único de la historia de usuario")
-    project_id: Annotated[ObjectId, MongoObjectId] = Field(..., description="ID del proyecto al que pertenece la HU")
+class UserStory(MongoDoc):
+    id: PyObjectId | None = Field(default=None, alias="_id", description="ID único de la historia de usuario")
+    project_id: PyObjectId = Field(..., description="ID del proyecto al que pertenece la HU")
     code: str = Field(..., description="Código identificador (ej: US-01)", example="US-01")
     epica: str = Field(..., description="Nombre de la épica relacionada", example="Autenticación")
     nombre: str = Field(..., description="Título de la historia", example="Login de usuario")
     descripcion: str = Field(..., description="Descripción detallada (Como [rol] quiero [acción] para [beneficio])")
     criterios: List[str] = Field(..., description="Lista de criterios de aceptación")
-    created_at: datetime = Field(default_factory=datetime.utcnow, description="Fecha de creación de la HU")
+    created_at: datetime = Field(default_factory=_utcnow, description="Fecha de creación de la HU")
     # Campos adicionales para Product Backlog
     priority: str = Field(default="Medium", description="Prioridad de la historia (Low, Medium, High, Must Have, etc.)", example="High")
     story_points: int = Field(default=0, description="Puntos de historia estimados", example=5)
@@ -40,30 +112,46 @@ class UserStory(MongoModel):
     deps: int = Field(default=0, description="Número de dependencias activas")
     ai: bool = Field(default=False, description="Indica si fue generada o analizada por IA")
 
-class DependencyPair(BaseModel):
+@dataclass(slots=True, frozen=True)
+class DependencyPair:
     frm: str
     to: List[str]
 
-class DependencyGraph(MongoModel):
-    id         : Annotated[ObjectId, MongoObjectId] | None = Field(default=None, alias="_id")
-    project_id : Annotated[ObjectId, MongoObjectId]
+class DependencyGraph(MongoDoc):
+    id         : PyObjectId | None = Field(default=None, alias="_id")
+    project_id : PyObjectId
     pairs      : list[DependencyPair]
     total_prompt_tokens: int = Field(default=0)
     total_completion_tokens: int = Field(default=0)
     total_processing_time_ms: float = Field(default=0.0)
 
-class ReleaseBacklog(MongoModel):
-    id: Annotated[ObjectId, MongoObjectId] | None = Field(default=None, alias="_id")
-    project_id: Annotated[ObjectId, MongoObjectId]
+    @classmethod
+    def from_mongo(cls, data: dict):
+        if not data:
+            return data
+        # Solo frm/to: los pares antiguos pueden traer claves extra (_id, reason...)
+        pairs = [{"frm": p.get("frm"), "to": p.get("to")} for p in data.get("pairs") or []]
+        return super().from_mongo({**data, "pairs": pairs})
+
+    @classmethod
+    def from_trusted_mongo(cls, data: dict):
+        if not data:
+            return data
+        pairs = [DependencyPair(p["frm"], p["to"]) for p in data.get("pairs") or []]
+        return super().from_trusted_mongo({**data, "pairs": pairs})
+
+class ReleaseBacklog(MongoDoc):
+    id: PyObjectId | None = Field(default=None, alias="_id")
+    project_id: PyObjectId
     us_codes: List[str] = Field(description="Lista ordenada de códigos de HU para el release.")
-    generated_at: datetime = Field(default_factory=datetime.utcnow)
+    generated_at: datetime = Field(default_factory=_utcnow)
     total_prompt_tokens: int = Field(default=0)
     total_completion_tokens: int = Field(default=0)
     total_processing_time_ms: float = Field(default=0.0)
 
-class ProjectConfig(MongoModel):
-    id: Annotated[ObjectId, MongoObjectId] | None = Field(default=None, alias="_id")
-    project_id: Annotated[ObjectId, MongoObjectId]
+class ProjectConfig(MongoDoc):
+    id: PyObjectId | None = Field(default=None, alias="_id")
+    project_id: PyObjectId
     num_devs: int = Field(..., description="Número de desarrolladores en el equipo")
     team_velocity: int = Field(..., description="Velocidad del equipo (story points por sprint)")
     sprint_duration: int = Field(..., description="Duración del sprint en semanas")
@@ -74,5 +162,11 @@ class ProjectConfig(MongoModel):
     optimistic_scenario: Optional[int] = Field(None, description="Escenario optimista (porcentaje)")
     realistic_scenario: Optional[int] = Field(None, description="Escenario realista (porcentaje)")
     pessimistic_scenario: Optional[int] = Field(None, description="Escenario pesimista (porcentaje)")
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    created_at: datetime = Field(default_factory=_utcnow)
+    updated_at: datetime = Field(default_factory=_utcnow)
+
+# ── Adaptadores para respuestas de listas ──────
+# Se crean una sola vez; el esquema se construye en el primer dump.
+USER_LIST = TypeAdapter(list[User], config=ConfigDict(defer_build=True))
+PROJECT_LIST = TypeAdapter(list[Project], config=ConfigDict(defer_build=True))
+USER_STORY_LIST = TypeAdapter(list[UserStory], config=ConfigDict(defer_build=True))
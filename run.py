@@ -1,25 +1,37 @@
 # run.py (o tu entrypoint)
 import logging
+import os
 import uvicorn
 import subprocess
 import sys
 
-from backend.app import app
+# Las dependencias se instalan en la imagen (Dockerfile) o con pip a mano;
+# BOOTSTRAP_DEPS=1 las instala antes de arrancar en un entorno nuevo.
+if os.getenv("BOOTSTRAP_DEPS") == "1":
+    try:
+        # Actualiza pip
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "--upgrade", "pip"])
+        # Instala requisitos del proyecto
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "backend/requirements.txt"])
+    except subprocess.CalledProcessError as e:
+        print(f"⚠️ Error instalando dependencias: {e}", file=sys.stderr)
 
-try:
-    # Actualiza pip
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "--upgrade", "pip"])
-    # Instala requisitos del proyecto
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "backend/requirements.txt"]);
-except subprocess.CalledProcessError as e:
-    print(f"⚠️ Error instalando dependencias: {e}", file=sys.stderr)
+from backend.app import app
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, format="%(message)s")
     print(app.docs_url)
+    # RELOAD=0 arranca sin el vigilante de archivos y con un worker por CPU.
+    # Cada worker abre su propio pool de Mongo: las conexiones en reposo son
+    # WEB_CONCURRENCY x MONGO_MIN_POOL_SIZE (ver backend/app/db.py).
+    reload = os.getenv("RELOAD", "1") == "1"
     uvicorn.run(
         "backend.app:app",   # la ruta a tu FastAPI
         host="127.0.0.1",
         port=8000,
-        reload=True
+        reload=reload,
+        workers=None if reload else int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        # "auto" usa uvloop/httptools si están instalados (uvicorn[standard]; uvloop no existe en Windows)
+        loop=os.getenv("UVICORN_LOOP", "auto"),
+        http=os.getenv("UVICORN_HTTP", "auto"),
     )
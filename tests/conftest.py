@@ -1,5 +1,8 @@
+import re
+import importlib
 import pytest
 import asyncio
+from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
 from backend.app.db import db
 
@@ -16,22 +19,178 @@ def event_loop():
 @pytest.fixture(autouse=True)
 async def cleanup_database():
     """Clean up test database before and after each test"""
-    # Setup: clean before test
-    test_collections = ["users", "projects", "user_stories", "dependencies", "project_configs"]
-    
-    for collection_name in test_collections:
+    test_collections = ["users", "user_credentials", "projects", "user_stories", "dependencies", "project_configs", "llm_cache"]
+
+    async def clean():
+        # Las credenciales no guardan el email: se borran por el user_id de los usuarios de test
         try:
-            await db[collection_name].delete_many({"email": {"$regex": "test"}})
-            await db[collection_name].delete_many({"code": {"$regex": "TEST"}})
+            test_users = await db.users.find({"email": {"$regex": "test"}}, {"_id": 1}).to_list(None)
+            await db.user_credentials.delete_many({"user_id": {"$in": [u["_id"] for u in test_users]}})
         except:
             pass
+
+        for collection_name in test_collections:
+            try:
+                await db[collection_name].delete_many({"email": {"$regex": "test"}})
+                await db[collection_name].delete_many({"code": {"$regex": "TEST"}})
+            except:
+                pass
+
+    # Setup: clean before test
+    await clean()
     
     yield
     
     # Teardown: clean after test
-    for collection_name in test_collections:
+    await clean()
+
+
+# ── Mongo en memoria para tests de servicios ──────────────────────
+# Cubre solo los operadores que usan los servicios: igualdad, $in, $or,
+# $and y $regex en filtros; $set/$unset en updates; proyecciones de inclusión.
+
+
+def _matches(doc, filtro):
+    for key, cond in filtro.items():
+        if key == "$or":
+            if not any(_matches(doc, f) for f in cond):
+                return False
+        elif key == "$and":
+            if not all(_matches(doc, f) for f in cond):
+                return False
+        elif isinstance(cond, dict) and "$in" in cond:
+            if doc.get(key) not in cond["$in"]:
+                return False
+        elif isinstance(cond, dict) and "$regex" in cond:
+            flags = re.I if "i" in cond.get("$options", "") else 0
+            if not isinstance(doc.get(key), str) or not re.search(cond["$regex"], doc[key], flags):
+                return False
+        elif doc.get(key) != cond:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return dict(doc)
+    keep = {k for k, v in projection.items() if v}
+    out = {k: v for k, v in doc.items() if k in keep}
+    if projection.get("_id", 1) and "_id" in doc:
+        out["_id"] = doc["_id"]
+    return out
+
+
+class _Result:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def skip(self, n):
+        return FakeCursor(self._docs[n:])
+
+    def limit(self, n):
+        return FakeCursor(self._docs[:n])
+
+    def project(self, projection):
+        return FakeCursor([_project(d, projection) for d in self._docs])
+
+    async def to_list(self, length=None):
+        return list(self._docs)
+
+    def __aiter__(self):
+        self._it = iter(self._docs)
+        return self
+
+    async def __anext__(self):
         try:
-            await db[collection_name].delete_many({"email": {"$regex": "test"}})
-            await db[collection_name].delete_many({"code": {"$regex": "TEST"}})
-        except:
-            pass
+            return next(self._it)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    def find(self, filtro=None, projection=None):
+        return FakeCursor([_project(d, projection) for d in self.docs if _matches(d, filtro or {})])
+
+    async def find_one(self, filtro=None, projection=None):
+        for d in self.docs:
+            if _matches(d, filtro or {}):
+                return _project(d, projection)
+        return None
+
+    async def count_documents(self, filtro):
+        return sum(1 for d in self.docs if _matches(d, filtro))
+
+    async def insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+        self.docs.append(dict(doc))
+        return _Result(inserted_id=doc["_id"])
+
+    async def insert_many(self, docs):
+        return _Result(inserted_ids=[(await self.insert_one(d)).inserted_id for d in docs])
+
+    async def replace_one(self, filtro, doc, upsert=False):
+        await self.find_one_and_replace(filtro, doc, upsert=upsert)
+
+    async def find_one_and_replace(self, filtro, doc, projection=None, upsert=False, return_document=False):
+        for i, d in enumerate(self.docs):
+            if _matches(d, filtro):
+                self.docs[i] = {**doc, "_id": d["_id"]}
+                return _project(self.docs[i] if return_document else d, projection)
+        if upsert:
+            new = {**doc, "_id": doc.get("_id", ObjectId())}
+            self.docs.append(new)
+            return _project(new, projection) if return_document else None
+        return None
+
+    async def update_one(self, filtro, update):
+        for d in self.docs:
+            if _matches(d, filtro):
+                d.update(update.get("$set", {}))
+                for k in update.get("$unset", {}):
+                    d.pop(k, None)
+                return _Result(modified_count=1)
+        return _Result(modified_count=0)
+
+    async def delete_one(self, filtro):
+        for i, d in enumerate(self.docs):
+            if _matches(d, filtro):
+                del self.docs[i]
+                return _Result(deleted_count=1)
+        return _Result(deleted_count=0)
+
+
+class FakeDB:
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name):
+        return self._collections.setdefault(name, FakeCollection())
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+@pytest.fixture
+def fake_db():
+    """Base de datos en memoria compartida por el test."""
+    return FakeDB()
+
+
+@pytest.fixture
+def use_fake_db(fake_db, monkeypatch):
+    """Importa un módulo por su ruta y sustituye su `db` por la base en memoria."""
+    def _use(module_name):
+        module = importlib.import_module(module_name)
+        monkeypatch.setattr(module, "db", fake_db)
+        return module
+    return _use
@@ -43,3 +43,36 @@ async def test_proxy_headers_middleware():
             headers={"X-Forwarded-Proto": "https"}
         )
         assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_user_stories_list_is_serialized_with_orjson(use_fake_db, fake_db):
+    """Test /user_stories/ list output (legacy keys, pagination, dates)"""
+    import json
+    from datetime import datetime
+    from bson import ObjectId
+    crud = use_fake_db("backend.api.routers.crud")
+    
+    pid = ObjectId()
+    for i in range(3):
+        await fake_db.user_stories.insert_one({
+            "project_id": pid,
+            "code": f"US-0{i}",
+            "epica": "Auth",
+            "nombre": f"Historia {i}",
+            "descripcion": "...",
+            "criterios": ["c"],
+            "created_at": datetime(2024, 1, 2, 3, 4, 5, 123000),
+            "storyPoints": 5,
+        })
+    
+    response = await crud.get_user_stories(projectId=str(pid))
+    assert response.media_type == "application/json"
+    items = json.loads(response.body)
+    assert [s["code"] for s in items] == ["US-00", "US-01", "US-02"]
+    assert items[0]["project_id"] == str(pid)
+    assert items[0]["created_at"] == "2024-01-02T03:04:05.123000"
+    assert items[0]["story_points"] == 5
+    
+    page = json.loads((await crud.get_user_stories(projectId=str(pid), page=2, size=2)).body)
+    assert page["total"] == 3 and page["pages"] == 2
+    assert [s["code"] for s in page["items"]] == ["US-02"]
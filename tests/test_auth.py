@@ -87,3 +87,57 @@ async def test_hash_password_long():
     
     assert hashed.startswith("$2b$")
     assert AuthService.verify_password(password, hashed)
+
+@pytest.mark.asyncio
+async def test_create_user_stores_hash_in_credentials(use_fake_db, fake_db):
+    """Test the password hash is stored outside the users collection"""
+    auth_module = use_fake_db("backend.api.services.auth_service")
+    from backend.api.schemas.requests import UserCreateIn
+    
+    user = await auth_module.AuthService().create_user(
+        UserCreateIn(email="test@example.com", name="Test User", password="Test123", role="student")
+    )
+    
+    assert "password_hash" not in fake_db.users.docs[0]
+    creds = fake_db.user_credentials.docs[0]
+    assert creds["user_id"] == user.id
+    assert auth_module.AuthService.verify_password("Test123", creds["password_hash"])
+
+@pytest.mark.asyncio
+async def test_create_user_rolls_back_when_credentials_fail(use_fake_db, fake_db, monkeypatch):
+    """Test a failed credentials write does not leave an orphan user"""
+    auth_module = use_fake_db("backend.api.services.auth_service")
+    from backend.api.schemas.requests import UserCreateIn
+    
+    async def broken_save(user_id, password_hash):
+        raise RuntimeError("write failed")
+    monkeypatch.setattr(auth_module.AuthService, "_save_credentials", staticmethod(broken_save))
+    
+    with pytest.raises(RuntimeError):
+        await auth_module.AuthService().create_user(
+            UserCreateIn(email="test@example.com", name="Test User", password="Test123", role="student")
+        )
+    assert fake_db.users.docs == []
+
+@pytest.mark.asyncio
+async def test_authenticate_migrates_legacy_hash(use_fake_db, fake_db):
+    """Test login with a hash still embedded in the user document"""
+    auth_module = use_fake_db("backend.api.services.auth_service")
+    svc = auth_module.AuthService()
+    await fake_db.users.insert_one({
+        "email": "test@example.com",
+        "name": "Test User",
+        "role": "student",
+        "password_hash": svc.hash_password("Test123"),
+    })
+    
+    assert await svc.authenticate_user("test@example.com", "Wrong123") is None
+    assert "password_hash" in fake_db.users.docs[0]
+    
+    user = await svc.authenticate_user("test@example.com", "Test123")
+    assert user.email == "test@example.com"
+    assert "password_hash" not in fake_db.users.docs[0]
+    assert fake_db.user_credentials.docs[0]["user_id"] == user.id
+    
+    # Tras migrar, el login lee la credencial de su colección
+    assert await svc.authenticate_user("test@example.com", "Test123") is not None
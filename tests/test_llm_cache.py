@@ -0,0 +1,72 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+
+@pytest.fixture
+def cache_module(use_fake_db):
+    return use_fake_db("backend.api.services.llm_cache")
+
+@pytest.mark.asyncio
+async def test_llm_cache_miss_then_hit(cache_module):
+    """Test a stored response is served from memory and from Mongo"""
+    cache = cache_module.LLMCache()
+    key = cache.key("gemini", "prompt", max_output_tokens=2048)
+    
+    assert await cache.get_many([key]) == {}
+    
+    await cache.set(key, '{"ok": true}')
+    assert await cache.get_many([key]) == {key: '{"ok": true}'}
+    
+    # Otro proceso (memoria vacía) la encuentra en Mongo
+    assert await cache_module.LLMCache().get_many([key]) == {key: '{"ok": true}'}
+
+def test_llm_cache_key_depends_on_params(cache_module):
+    """Test generation params are part of the cache key"""
+    LLMCache = cache_module.LLMCache
+    assert LLMCache.key("gemini", "prompt", max_output_tokens=2048) != LLMCache.key("gemini", "prompt", max_output_tokens=1024)
+
+@pytest.mark.asyncio
+async def test_llm_cache_memory_entries_expire(cache_module, fake_db):
+    """Test the in-process LRU honours the TTL"""
+    cache = cache_module.LLMCache(ttl_seconds=0)
+    await cache.set("k", "text")
+    fake_db.llm_cache.docs.clear()
+    
+    assert await cache.get_many(["k"]) == {}
+    assert "k" not in cache._memory
+
+@pytest.mark.asyncio
+async def test_llm_cache_skips_expired_mongo_documents(cache_module, fake_db):
+    """Test documents past the TTL but not yet removed by Mongo are ignored"""
+    cache = cache_module.LLMCache(ttl_seconds=3600)
+    old = datetime.now(timezone.utc) - timedelta(hours=2)
+    await fake_db.llm_cache.insert_one({"_id": "k", "text": "stale", "created_at": old.replace(tzinfo=None)})
+    
+    assert await cache.get_many(["k"]) == {}
+
+@pytest.mark.asyncio
+async def test_ttl_change_updates_existing_index(monkeypatch):
+    """Test a new LLM_CACHE_TTL_SECONDS is applied to the existing TTL index"""
+    import importlib
+    from pymongo.errors import OperationFailure
+    app_module = importlib.import_module("backend.app")
+    commands = []
+    attempts = []
+    
+    class Collection:
+        async def create_indexes(self, models):
+            attempts.append(models)
+            if len(attempts) == 1:
+                raise OperationFailure("Index already exists with different options", code=85)
+    
+    class DB:
+        def __getitem__(self, name):
+            return Collection()
+        
+        async def command(self, *args, **kwargs):
+            commands.append((args, kwargs))
+    
+    monkeypatch.setattr(app_module, "db", DB())
+    await app_module._create_indexes("llm_cache", [({"created_at": 1}, {"expireAfterSeconds": 60})])
+    
+    assert commands == [(("collMod", "llm_cache"), {"index": {"keyPattern": {"created_at": 1}, "expireAfterSeconds": 60}})]
+    assert len(attempts) == 2
@@ -0,0 +1,73 @@
+import pytest
+from bson import ObjectId
+
+@pytest.fixture
+def backlog_module(use_fake_db):
+    return use_fake_db("backend.api.services.release_backlog_service")
+
+@pytest.mark.asyncio
+async def test_generate_backlog_upserts_one_document_per_project(backlog_module, fake_db, monkeypatch):
+    """Test regenerating a backlog replaces the stored one and keeps its id"""
+    pid = ObjectId()
+    for code in ("US-02", "US-01"):
+        await fake_db.user_stories.insert_one(
+            {"project_id": pid, "code": code, "nombre": code, "descripcion": "..."}
+        )
+    
+    answers = iter([["US-02", "US-01"], ["US-01"]])
+    async def fake_ask(self, prompt):
+        return next(answers), 10, 5, 1.0
+    monkeypatch.setattr(backlog_module.ReleaseBacklogService, "_ask_gemini", fake_ask)
+    
+    svc = backlog_module.ReleaseBacklogService()
+    first = await svc.generate_backlog(str(pid))
+    assert fake_db.release_backlogs.docs[0]["us_codes"] == ["US-02", "US-01"]
+    
+    second = await svc.generate_backlog(str(pid))
+    assert len(fake_db.release_backlogs.docs) == 1
+    assert fake_db.release_backlogs.docs[0]["us_codes"] == ["US-01"]
+    assert second.id == first.id == str(fake_db.release_backlogs.docs[0]["_id"])
+
+@pytest.mark.asyncio
+async def test_unique_index_drops_superseded_backlogs(monkeypatch):
+    """Test duplicated backlogs keep only the newest before the unique index is created"""
+    import importlib
+    from pymongo.errors import DuplicateKeyError
+    app_module = importlib.import_module("backend.app")
+    attempts = []
+    deleted = []
+    
+    class Groups:
+        def __init__(self, groups):
+            self._groups = iter(groups)
+        
+        def __aiter__(self):
+            return self
+        
+        async def __anext__(self):
+            try:
+                return next(self._groups)
+            except StopIteration:
+                raise StopAsyncIteration
+    
+    class Collection:
+        async def create_indexes(self, models):
+            attempts.append(models)
+            if len(attempts) == 1:
+                raise DuplicateKeyError("E11000 duplicate key error", code=11000)
+        
+        def aggregate(self, pipeline):
+            return Groups([{"_id": "p1", "ids": ["newest", "older", "oldest"]}])
+        
+        async def delete_many(self, filtro):
+            deleted.append(filtro)
+    
+    class DB:
+        def __getitem__(self, name):
+            return Collection()
+    
+    monkeypatch.setattr(app_module, "db", DB())
+    await app_module._create_indexes("release_backlogs", app_module.INDEX_MAP["release_backlogs"])
+    
+    assert deleted == [{"_id": {"$in": ["older", "oldest"]}}]
+    assert len(attempts) == 2
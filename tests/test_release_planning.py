@@ -0,0 +1,47 @@
+import copy
+import pytest
+from datetime import date
+
+@pytest.fixture
+def planning_module(use_fake_db):
+    return use_fake_db("backend.api.services.release_planning_service")
+
+def _config(planning_module, target):
+    return planning_module.ParsedProjectConfig(
+        num_devs=3,
+        sprint_duration_weeks=2,
+        team_capacity_hours=0,
+        team_velocity=30,
+        release_target_date=target,
+    )
+
+def test_multi_release_validation_does_not_modify_plan(planning_module):
+    """Test validating an AI plan leaves the plan that gets stored untouched"""
+    svc = planning_module.ReleasePlanningService()
+    plan = {"releases": [{"release_number": 1, "sprints": [{"stories": [{"code": "US-01"}]}]}]}
+    original = copy.deepcopy(plan)
+    
+    result = svc._validate_generated_plan_viability_multi_release(plan, _config(planning_module, date(2030, 1, 1)))
+    
+    assert result["is_viable"]
+    assert plan == original
+
+def test_multi_release_validation_with_null_sprints(planning_module):
+    """Test a release returned with sprints: null"""
+    svc = planning_module.ReleasePlanningService()
+    plan = {"releases": [{"release_number": 1, "sprints": None}]}
+    
+    result = svc._validate_generated_plan_viability_multi_release(plan, _config(planning_module, None))
+    
+    assert not result["is_viable"]
+    assert result["issues"] == ["Último release no contiene sprints"]
+
+def test_multi_release_validation_detects_deadline_overrun(planning_module):
+    """Test the last sprint end date is checked against the target date"""
+    svc = planning_module.ReleasePlanningService()
+    plan = {"releases": [{"sprints": [{"end_date": "2030-03-01"}]}]}
+    
+    result = svc._validate_generated_plan_viability_multi_release(plan, _config(planning_module, date(2030, 2, 1)))
+    
+    assert not result["is_viable"]
+    assert result["issues"][0].startswith("Proyecto termina 28 días")
@@ -1,8 +1,10 @@
 import pytest
 from datetime import date
+from bson import ObjectId
 from pydantic import ValidationError
 from backend.api.schemas.requests import UserCreateIn, ProjectConfigCreateIn
 from backend.api.schemas.responses import ReleasePlanningOut, DashboardStatsOut, ProjectStatsOut
+from backend.app.schemas import DependencyGraph, DependencyPair, UserStory
 
 def test_user_create_in_valid():
     """Test valid user creation schema"""
@@ -135,3 +137,56 @@ def test_release_planning_out():
     assert planning.num_releases == 2
     assert len(planning.releases) == 2
     assert planning.releases[0]["release_title"] == "MVP Release"
+
+def test_dependency_graph_from_mongo_ignores_extra_pair_keys():
+    """Test dependency graph read with legacy pair fields"""
+    doc = {
+        "_id": ObjectId(),
+        "project_id": ObjectId(),
+        "pairs": [{"frm": "US-01", "to": ["US-02"], "_id": ObjectId(), "reason": "legacy"}],
+    }
+    graph = DependencyGraph.from_mongo(doc)
+    assert graph.pairs == [DependencyPair(frm="US-01", to=["US-02"])]
+
+def _story_doc(**overrides):
+    doc = {
+        "_id": ObjectId(),
+        "project_id": ObjectId(),
+        "code": "US-01",
+        "epica": "Autenticación",
+        "nombre": "Login",
+        "descripcion": "Como usuario quiero entrar",
+        "criterios": ["Dado...", "Cuando...", "Entonces..."],
+    }
+    doc.update(overrides)
+    return doc
+
+def test_user_story_from_mongo_coerces_legacy_types():
+    """Test story read coerces legacy stored values to the schema types"""
+    story = UserStory.from_mongo(_story_doc(storyPoints="8", dor=7.0, created_at="2024-01-02T03:04:05"))
+    assert story.story_points == 8
+    assert story.dor == 7
+    assert story.created_at.year == 2024
+
+def test_user_story_from_mongo_rejects_malformed_document():
+    """Test story read with a missing required field"""
+    doc = _story_doc()
+    del doc["epica"]
+    with pytest.raises(ValidationError):
+        UserStory.from_mongo(doc)
+
+def test_dependency_graph_from_trusted_mongo_maps_aliases():
+    """Test trusted graph read resolves _id and camelCase keys without validating"""
+    gid, pid = ObjectId(), ObjectId()
+    graph = DependencyGraph.from_trusted_mongo({
+        "_id": gid,
+        "projectId": pid,
+        "pairs": [{"frm": "US-01", "to": ["US-02"], "reason": "legacy"}],
+        "total_prompt_tokens": 12,
+    })
+    assert graph.id == gid
+    assert graph.project_id == pid
+    assert graph.pairs == [DependencyPair(frm="US-01", to=["US-02"])]
+    assert graph.total_prompt_tokens == 12
+    assert graph.total_completion_tokens == 0
+    assert graph.model_dump(by_alias=True)["_id"] == gid